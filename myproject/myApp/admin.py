@@ -1,6 +1,12 @@
 from django.contrib import admin
-from .models import FileUpload
+from .models import FileUpload, ComponentChange
 
 @admin.register(FileUpload)
 class FileUploadAdmin(admin.ModelAdmin):
-    list_display = ('id', 'file1', 'date1', 'file2', 'date2')
\ No newline at end of file
+    list_display = ('id', 'file1_name', 'date1', 'file2_name', 'date2')
+
+
+@admin.register(ComponentChange)
+class ComponentChangeAdmin(admin.ModelAdmin):
+    list_display = ('component', 'customer_part', 'change_type', 'week', 'upload')
+    search_fields = ('component', 'previous_component', 'customer_part')
@@ -0,0 +1,77 @@
+from django.db.models import Q
+from django.shortcuts import get_object_or_404
+from django.http import Http404
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from .models import FileUpload, ComponentChange
+from .serializers import FileUploadSerializer, ComponentChangeSerializer
+from .matching import clean_value
+from .concurrency import comparison_slot
+
+
+class FileUploadListAPIView(APIView):
+    def get(self, request):
+        uploads = FileUpload.objects.all().order_by('-id')
+        serializer = FileUploadSerializer(uploads, many=True)
+        return Response(serializer.data)
+
+    def post(self, request):
+        serializer = FileUploadSerializer(data=request.data)
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ComponentTimelineAPIView(APIView):
+    def get(self, request, component):
+        component = clean_value(component)
+        changes = ComponentChange.objects.filter(
+            Q(component=component) | Q(previous_component=component)
+        )
+        customer_part = request.query_params.get('customer_part')
+        if customer_part:
+            changes = changes.filter(customer_part=clean_value(customer_part))
+        serializer = ComponentChangeSerializer(changes.order_by('week', 'upload_id'), many=True)
+        return Response(serializer.data)
+
+
+class BomRowsAPIView(APIView):
+    """Normalized rows of an uploaded BOM, sliced straight from its memory-mapped sidecar"""
+    FILE_FIELDS = {'x': 'file1', 'xn': 'file2'}
+    MAX_LIMIT = 1000
+
+    def get(self, request, upload_id, side):
+        # Only this endpoint needs the comparison stack, the other API views stay light
+        from .utils import load_boms, check_sheet_limits
+        from .sidecar import load_sidecar
+
+        upload = get_object_or_404(FileUpload, id=upload_id)
+        if side not in self.FILE_FIELDS:
+            raise Http404("BOM side must be 'x' or 'xn'.")
+        try:
+            offset = max(int(request.query_params.get('offset', 0)), 0)
+            limit = min(max(int(request.query_params.get('limit', 100)), 0), self.MAX_LIMIT)
+        except ValueError:
+            return Response({'error': "offset and limit must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+
+        path = getattr(upload, self.FILE_FIELDS[side]).path
+        bom = load_sidecar(path)
+        if bom is None:
+            # Not parsed yet, the parse falls under the comparison limits and cap
+            try:
+                check_sheet_limits(path)
+                with comparison_slot():
+                    bom = load_boms(path)[0]
+            except ValueError as e:
+                busy = "Server busy" in str(e)
+                return Response({'error': str(e)}, status=(
+                    status.HTTP_503_SERVICE_UNAVAILABLE if busy else status.HTTP_400_BAD_REQUEST))
+
+        headers, table = bom
+        return Response({
+            'count': len(table),
+            'headers': headers,
+            'rows': table.records(offset, offset + limit),
+        })
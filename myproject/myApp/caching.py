@@ -0,0 +1,51 @@
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from .models import FileUpload
+from .timeline import build_comparison_preview
+
+
+UPLOADS_LIST_KEY = 'myApp:uploads-list'
+UPLOADS_LIST_TIMEOUT = 60 * 60
+PREVIEW_KEY = 'myApp:comparison-preview:{}'
+
+
+def get_uploads_list():
+    """All uploads, newest first, served from the cache until an upload is written"""
+    uploads = cache.get(UPLOADS_LIST_KEY)
+    if uploads is None:
+        uploads = list(FileUpload.objects.all().order_by('-id'))
+        cache.set(UPLOADS_LIST_KEY, uploads, UPLOADS_LIST_TIMEOUT)
+    return uploads
+
+
+async def aget_uploads_list():
+    uploads = await cache.aget(UPLOADS_LIST_KEY)
+    if uploads is None:
+        uploads = await sync_to_async(get_uploads_list)()
+    return uploads
+
+
+def invalidate_uploads_list():
+    cache.delete(UPLOADS_LIST_KEY)
+
+
+def get_comparison_preview(upload):
+    """Cached preview rows and change counts of an upload's comparison.
+
+    None without output, or for outputs older than the component timeline until
+    backfill_timeline has recorded their changes.
+    """
+    if not upload.output:
+        return None
+    key = PREVIEW_KEY.format(upload.id)
+    preview = cache.get(key)
+    if preview is None:
+        preview = build_comparison_preview(upload)
+        if preview is None:
+            return None
+        cache.set(key, preview)
+    return preview
+
+
+def invalidate_comparison_preview(upload_id):
+    cache.delete(PREVIEW_KEY.format(upload_id))
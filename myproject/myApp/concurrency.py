@@ -0,0 +1,73 @@
+import asyncio
+import multiprocessing
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+from django.conf import settings
+from django.db import close_old_connections
+
+
+comparison_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'COMPARISON_WORKERS', 4),
+    thread_name_prefix='comparison',
+)
+
+# Comparisons running at once in this process, beyond it requests wait for a free slot
+comparison_slots = threading.BoundedSemaphore(getattr(settings, 'COMPARISON_MAX_CONCURRENT', 2))
+
+_parse_executor = None
+_parse_executor_lock = threading.Lock()
+
+
+def get_parse_executor():
+    """Process pool parsing workbooks in parallel, None when parsing runs inline"""
+    global _parse_executor
+    workers = getattr(settings, 'COMPARISON_PARSE_WORKERS', 2)
+    if workers < 2:
+        return None
+    with _parse_executor_lock:
+        if _parse_executor is None:
+            # Spawned, not forked: the web process runs threads that a fork would copy mid-operation
+            _parse_executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+    return _parse_executor
+
+
+@contextmanager
+def comparison_slot():
+    """Hold a comparison slot, giving up after COMPARISON_QUEUE_TIMEOUT seconds of waiting"""
+    if not comparison_slots.acquire(timeout=getattr(settings, 'COMPARISON_QUEUE_TIMEOUT', 30)):
+        raise ValueError("Server busy: too many comparisons are running, please try again in a moment.")
+    try:
+        yield
+    finally:
+        comparison_slots.release()
+
+
+def reset_parse_executor(broken):
+    """Drop a pool broken by a dead worker, the next get_parse_executor starts a new one"""
+    global _parse_executor
+    with _parse_executor_lock:
+        if _parse_executor is broken:
+            _parse_executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def call_with_fresh_connections(func, *args, **kwargs):
+    # Executor threads outlive requests, so drop expired DB connections like a request would
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run blocking upload/comparison work on the comparison executor, off the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        comparison_executor, partial(call_with_fresh_connections, func, *args, **kwargs)
+    )
@@ -0,0 +1,59 @@
+import csv
+import json
+from .models import ComponentChange
+
+
+EXPORT_FIELDS = ['component', 'customer_part', 'previous_component', 'change_type',
+                 'quantity_x', 'quantity_xn', 'description_x', 'description_xn', 'week']
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class Echo:
+    """File-like object handing back what csv.writer writes instead of buffering it"""
+
+    def write(self, value):
+        return value
+
+
+async def aiter_changes(upload, chunk_size=2000):
+    """Stored diff rows of an upload, fetched one keyset page of ``chunk_size`` rows at a time.
+
+    Every page is its own bounded query, so memory stays flat even where the
+    driver buffers a whole result set on the client (MySQL without server-side
+    cursors).
+    """
+    last_id = 0
+    while True:
+        page = (
+            ComponentChange.objects.filter(upload=upload, id__gt=last_id)
+            .order_by('id')
+            .values('id', *EXPORT_FIELDS)[:chunk_size]
+        )
+        fetched = 0
+        async for row in page.aiterator(chunk_size=chunk_size):
+            fetched += 1
+            last_id = row.pop('id')
+            yield row
+        if fetched < chunk_size:
+            return
+
+
+async def stream_csv(rows):
+    writer = csv.DictWriter(Echo(), EXPORT_FIELDS)
+    yield writer.writeheader()
+    async for row in rows:
+        yield writer.writerow(row)
+
+
+async def stream_ndjson(rows):
+    async for row in rows:
+        yield json.dumps(row, default=str) + '\n'
+
+
+STREAMS = {
+    'csv': stream_csv,
+    'ndjson': stream_ndjson,
+}
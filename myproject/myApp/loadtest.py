@@ -0,0 +1,266 @@
+import io
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError
+from urllib.parse import urljoin
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+from openpyxl import Workbook
+from .utils import EXPECTED_HEADERS
+
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Relative weight of each scenario in the request mix
+DEFAULT_MIX = {'upload': 1, 'uploads_table': 4, 'download': 3, 'api': 2}
+# Iterations between refreshes of a planner's list of downloadable uploads
+ID_REFRESH_EVERY = 20
+
+
+def build_synthetic_bom(rows, seed=0, change_rate=0.05):
+    """Return (X, X-N) workbook bytes for a synthetic harness BOM of ``rows`` components.
+
+    X-N differs from X in roughly ``change_rate`` of its rows: changed quantities,
+    edited descriptions and components only present in one of the files.
+    """
+    rng = random.Random(seed)
+    groups = ['WIRE', 'TERMINAL', 'SEAL', 'CONNECTOR', 'TAPE', 'CLIP']
+    base = [
+        (f"C{100000 + i}", f"CP{i % 40:03d}", str(rng.randint(1, 20)), f"{rng.choice(groups)} {rng.randint(1, 999)}",
+         rng.choice(groups))
+        for i in range(rows)
+    ]
+
+    previous = []
+    for component, customer_part, quantity, description, group in base:
+        roll = rng.random()
+        if roll < change_rate / 4:
+            continue  # Added in X
+        if roll < change_rate / 2:
+            previous.append((component + 'A', customer_part, quantity, description, group))  # Removed
+        elif roll < change_rate * 3 / 4:
+            previous.append((component, customer_part, str(int(quantity) + 1), description, group))
+        elif roll < change_rate:
+            previous.append((component, customer_part, quantity, description + ' OLD', group))
+        else:
+            previous.append((component, customer_part, quantity, description, group))
+
+    return write_bom_bytes(base), write_bom_bytes(previous)
+
+
+def write_bom_bytes(components):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["BOM export", "Sitz Rechts VE"])
+    ws.append([])
+    ws.append(EXPECTED_HEADERS)
+    for component, customer_part, quantity, description, group in components:
+        ws.append(["P1", "PN1", "1000", customer_part, "Harness", "S1",
+                   component, None, group, description, "PC", int(quantity)])
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def encode_multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, value in fields.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, content) in files.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                   f'Content-Type: {XLSX_CONTENT_TYPE}\r\n\r\n'.encode())
+        body.write(content)
+        body.write(b'\r\n')
+    body.write(f'--{boundary}--\r\n'.encode())
+    return body.getvalue(), f'multipart/form-data; boundary={boundary}'
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of ``values``, None when empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def rss_bytes(pid):
+    """Resident memory of a process and its children, read from /proc (Linux only)"""
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/status') as status:
+                for line in status:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+            with open(f'/proc/{current}/task/{current}/children') as children:
+                pending.extend(int(child) for child in children.read().split())
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+    return total
+
+
+def is_error(scenario, status, body):
+    if status is None or status >= 400:
+        return True
+    # Rejected and busy comparisons are answered with the form page (200), only a
+    # stored comparison redirects to the uploads table
+    return scenario == 'upload' and not (status == 302 and body.endswith(b'/uploads/'))
+
+
+class NoRedirect(HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class PlannerSession:
+    """One simulated planner with its own cookie jar and CSRF token"""
+
+    def __init__(self, base_url, boms, timeout):
+        self.base_url = base_url
+        self.boms = boms
+        self.timeout = timeout
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies))
+        self.no_redirect_opener = build_opener(HTTPCookieProcessor(self.cookies), NoRedirect)
+        self.output_ids = None
+
+    def request(self, path, data=None, headers=None, follow_redirects=True):
+        request = Request(urljoin(self.base_url, path), data=data, headers=headers or {})
+        opener = self.opener if follow_redirects else self.no_redirect_opener
+        try:
+            with opener.open(request, timeout=self.timeout) as response:
+                body = response.read()
+                return response.status, body
+        except HTTPError as error:
+            # An unfollowed redirect comes back as its status and target location
+            if 300 <= error.code < 400:
+                return error.code, error.headers.get('Location', '').encode()
+            return error.code, error.read()
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        self.request('/')
+        return next((cookie.value for cookie in self.cookies if cookie.name == 'csrftoken'), '')
+
+    def upload(self, rng):
+        x, xn = rng.choice(self.boms)
+        week = rng.randint(2, 52)
+        body, content_type = encode_multipart(
+            {'csrfmiddlewaretoken': self.csrf_token(), 'date1': f'2025-W{week:02d}', 'date2': f'2025-W{week - 1:02d}'},
+            {'file1': ('x.xlsx', x), 'file2': ('xn.xlsx', xn)},
+        )
+        # Not followed, the uploads table render would count towards upload latency
+        return self.request('/', data=body, headers={'Content-Type': content_type, 'Referer': self.base_url},
+                            follow_redirects=False)
+
+    def uploads_table(self, rng):
+        return self.request('/uploads/')
+
+    def api(self, rng):
+        return self.request('/api/uploads/', headers={'Accept': 'application/json'})
+
+    def refresh_output_ids(self):
+        status, body = self.api(None)
+        self.output_ids = [upload['id'] for upload in json.loads(body or b'[]')
+                           if upload.get('output')] if status == 200 else []
+
+    def prepare(self, scenario, iteration):
+        """Untimed setup before a scenario; returns the scenario that will actually run"""
+        if scenario != 'download':
+            return scenario
+        if self.output_ids is None or iteration % ID_REFRESH_EVERY == 0:
+            self.refresh_output_ids()
+        # Nothing to download yet, so it is recorded as the page it requests instead
+        return scenario if self.output_ids else 'uploads_table'
+
+    def download(self, rng):
+        return self.request(f'/download/{rng.choice(self.output_ids)}/')
+
+
+def run_load_test(base_url, users=10, duration=30, rows=2000, mix=None, server_pid=None,
+                  timeout=120, seed=0):
+    """Drive the upload flow with concurrent planners and return a metrics report"""
+    mix = mix or DEFAULT_MIX
+    scenarios, weights = zip(*mix.items())
+    boms = [build_synthetic_bom(rows, seed=seed + i) for i in range(3)]
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    memory = {'peak': 0, 'samples': []}
+    stop_sampling = threading.Event()
+
+    def sample_memory():
+        while not stop_sampling.is_set():
+            rss = rss_bytes(server_pid)
+            memory['samples'].append(rss)
+            memory['peak'] = max(memory['peak'], rss)
+            stop_sampling.wait(0.5)
+
+    def planner(index):
+        rng = random.Random(seed * 1000 + index)
+        session = PlannerSession(base_url, boms, timeout)
+        iteration = 0
+        while time.monotonic() < deadline:
+            try:
+                scenario = session.prepare(rng.choices(scenarios, weights)[0], iteration)
+            except OSError:
+                scenario = 'uploads_table'
+            iteration += 1
+            start = time.perf_counter()
+            try:
+                status, body = getattr(session, scenario)(rng)
+            except OSError:
+                status, body = None, b''
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies[scenario].append(elapsed)
+                if is_error(scenario, status, body):
+                    errors[scenario] += 1
+
+    sampler = threading.Thread(target=sample_memory, daemon=True) if server_pid else None
+    if sampler:
+        sampler.start()
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(planner, range(users)))
+    elapsed = time.monotonic() - started
+    stop_sampling.set()
+
+    report = {'users': users, 'duration': elapsed, 'scenarios': {}}
+    for scenario, values in latencies.items():
+        report['scenarios'][scenario] = {
+            'requests': len(values),
+            'errors': errors[scenario],
+            'throughput': len(values) / elapsed,
+            'p50': percentile(values, 0.50),
+            'p95': percentile(values, 0.95),
+            'p99': percentile(values, 0.99),
+        }
+    all_values = [value for values in latencies.values() for value in values]
+    report['total'] = {
+        'requests': len(all_values),
+        'errors': sum(errors.values()),
+        'throughput': len(all_values) / elapsed if elapsed else 0,
+        'p50': percentile(all_values, 0.50),
+        'p95': percentile(all_values, 0.95),
+        'p99': percentile(all_values, 0.99),
+    }
+    if server_pid:
+        report['memory'] = {
+            'peak_rss': memory['peak'],
+            'final_rss': memory['samples'][-1] if memory['samples'] else 0,
+        }
+    return report
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from myApp.caching import invalidate_comparison_preview
+from myApp.models import FileUpload
+from myApp.timeline import record_component_changes
+
+
+class Command(BaseCommand):
+    help = "Record the component timeline of uploads compared before it existed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="List the uploads without recording anything.")
+
+    def handle(self, *args, **options):
+        # The comparison stack is only needed here, not for every management command
+        from myApp.utils import compare_boms
+
+        pending = FileUpload.objects.filter(changes_recorded=False).exclude(output='').exclude(output__isnull=True)
+        recorded = failed = 0
+        for upload in pending.order_by('id').iterator():
+            if options['dry_run']:
+                self.stdout.write(f"Would record upload {upload.id}.")
+                recorded += 1
+                continue
+            # Compared again from the stored BOMs, which the output workbook was generated from
+            try:
+                comparison = compare_boms(upload.file1.path, upload.file2.path)
+            except (OSError, ValueError) as e:
+                self.stderr.write(f"Upload {upload.id}: {e}")
+                failed += 1
+                continue
+            count = record_component_changes(upload, *comparison)
+            invalidate_comparison_preview(upload.id)
+            self.stdout.write(f"Upload {upload.id}: {count} change(s).")
+            recorded += 1
+
+        prefix = "Would record" if options['dry_run'] else "Recorded"
+        self.stdout.write(f"{prefix} {recorded} upload(s), {failed} failed.")
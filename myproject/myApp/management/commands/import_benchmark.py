@@ -0,0 +1,73 @@
+import json
+import os
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Must only load when a comparison or API request needs them. The rest_framework and
+# django_filters packages themselves load at start-up as INSTALLED_APPS, only DRF's
+# view and serializer stack is kept lazy.
+HEAVY_MODULES = ('pandas', 'numpy', 'openpyxl', 'rest_framework.views', 'rest_framework.serializers')
+# Must not load with the API views either, only with a request that parses a BOM
+COMPARISON_MODULES = ('pandas', 'numpy', 'openpyxl')
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+import {urlconf}
+seconds = time.perf_counter() - start
+loaded = [name for name in {heavy!r} if name in sys.modules]
+import myApp.api
+print(json.dumps({{
+    'seconds': seconds,
+    'loaded': loaded,
+    'api_loaded': [name for name in {comparison!r} if name in sys.modules],
+}}))
+"""
+
+
+def parse_importtime(stderr):
+    """Top-level imports from ``python -X importtime`` output as (cumulative µs, module)"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if cumulative.strip().isdigit() and not name.startswith('  '):
+            modules.append((int(cumulative), name.strip()))
+    return sorted(modules, reverse=True)
+
+
+class Command(BaseCommand):
+    help = "Measure cold import time of the URLconf in a fresh interpreter and check heavy modules stay lazy."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-seconds', type=float, help="Fail when the cold import takes longer than this.")
+        parser.add_argument('--top', type=int, default=10, help="Number of slowest top-level imports to list.")
+
+    def handle(self, *args, **options):
+        probe = PROBE.format(urlconf=settings.ROOT_URLCONF, heavy=HEAVY_MODULES, comparison=COMPARISON_MODULES)
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE,
+                   PYTHONPATH=os.pathsep.join(sys.path))
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', probe],
+            capture_output=True, text=True, cwd=settings.BASE_DIR, env=env,
+        )
+        if result.returncode:
+            raise CommandError(f"Import probe failed:\n{result.stderr[-2000:]}")
+
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        self.stdout.write(f"Cold start (django.setup + {settings.ROOT_URLCONF}): {report['seconds']:.3f}s")
+        for cumulative, name in parse_importtime(result.stderr)[:options['top']]:
+            self.stdout.write(f"  {cumulative / 1e6:8.3f}s  {name}")
+
+        if report['loaded']:
+            raise CommandError(f"Heavy modules loaded at start-up: {', '.join(report['loaded'])}")
+        if report['api_loaded']:
+            raise CommandError(f"Comparison modules loaded with the API views: {', '.join(report['api_loaded'])}")
+        if options['max_seconds'] is not None and report['seconds'] > options['max_seconds']:
+            raise CommandError(f"Cold start took {report['seconds']:.3f}s, budget is {options['max_seconds']}s")
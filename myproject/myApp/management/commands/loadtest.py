@@ -0,0 +1,49 @@
+import json
+from django.core.management.base import BaseCommand
+from myApp.loadtest import run_load_test, DEFAULT_MIX
+
+
+class Command(BaseCommand):
+    help = ("Simulate concurrent planners uploading, listing and downloading comparisons against a running "
+            "server and report throughput, latency percentiles and server memory.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help="Base URL of the server under test.")
+        parser.add_argument('--users', type=int, default=10, help="Concurrent simulated planners.")
+        parser.add_argument('--duration', type=float, default=30, help="Seconds to keep sending requests.")
+        parser.add_argument('--rows', type=int, default=2000, help="Components per synthetic BOM.")
+        parser.add_argument('--server-pid', type=int, help="Server master PID; its and its workers' RSS is sampled.")
+        parser.add_argument('--timeout', type=float, default=120, help="Per-request timeout in seconds.")
+        parser.add_argument('--seed', type=int, default=0, help="Seed for synthetic BOMs and the request mix.")
+        for scenario, weight in DEFAULT_MIX.items():
+            parser.add_argument(f"--{scenario.replace('_', '-')}-weight", type=int, default=weight,
+                                dest=f'{scenario}_weight', help=f"Relative weight of the {scenario} scenario.")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        mix = {scenario: options[f'{scenario}_weight'] for scenario in DEFAULT_MIX if options[f'{scenario}_weight']}
+        report = run_load_test(
+            options['url'].rstrip('/') + '/',
+            users=options['users'],
+            duration=options['duration'],
+            rows=options['rows'],
+            mix=mix,
+            server_pid=options['server_pid'],
+            timeout=options['timeout'],
+            seed=options['seed'],
+        )
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(f"{report['users']} planners for {report['duration']:.1f}s")
+        self.stdout.write(f"{'scenario':<15}{'requests':>10}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        rows = sorted(report['scenarios'].items()) + [('total', report['total'])]
+        for scenario, stats in rows:
+            p50, p95, p99 = (stats[key] * 1000 if stats[key] is not None else 0 for key in ('p50', 'p95', 'p99'))
+            self.stdout.write(f"{scenario:<15}{stats['requests']:>10}{stats['errors']:>8}"
+                              f"{stats['throughput']:>9.1f}{p50:>9.0f}{p95:>9.0f}{p99:>9.0f}")
+        if 'memory' in report:
+            self.stdout.write(f"Server RSS: peak {report['memory']['peak_rss'] / 2**20:.0f} MiB, "
+                              f"final {report['memory']['final_rss'] / 2**20:.0f} MiB")
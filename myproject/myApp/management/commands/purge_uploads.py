@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from myApp import retention
+
+
+class Command(BaseCommand):
+    help = "Apply the upload retention policy and remove orphaned media files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age-days', type=int, help="Delete uploads whose KW(X) is older than this.")
+        parser.add_argument('--keep', type=int, dest='max_count', help="Keep only the newest N uploads.")
+        parser.add_argument('--orphan-grace-hours', type=int, help="Minimum age of an unreferenced file before it is removed.")
+        parser.add_argument('--batch-size', type=int, help="Rows deleted per transaction.")
+        parser.add_argument('--skip-orphans', action='store_true', help="Do not scan the media tree for orphaned files.")
+        parser.add_argument('--dry-run', action='store_true', help="Report what would be done without changing anything.")
+
+    def handle(self, *args, **options):
+        policy = retention.get_policy(
+            MAX_AGE_DAYS=options['max_age_days'],
+            MAX_COUNT=options['max_count'],
+            ORPHAN_GRACE_HOURS=options['orphan_grace_hours'],
+            BATCH_SIZE=options['batch_size'],
+        )
+        dry_run = options['dry_run']
+        prefix = "Would delete" if dry_run else "Deleted"
+
+        expired = retention.expired_upload_ids(policy)
+        deleted = retention.purge_uploads(expired, policy['BATCH_SIZE'], dry_run=dry_run)
+        self.stdout.write(f"{prefix} {deleted} expired upload(s).")
+
+        if not options['skip_orphans']:
+            orphans = retention.find_orphans(policy)
+            removed = retention.delete_orphans(orphans, dry_run=dry_run)
+            self.stdout.write(f"{prefix} {removed} orphaned file(s).")
+
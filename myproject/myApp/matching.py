@@ -0,0 +1,95 @@
+import re
+from collections import Counter, defaultdict
+
+
+NGRAM_SIZE = 3
+MIN_RENAME_SIMILARITY = 0.6
+# A shared description alone is common (cable ties, seals), the component number must be close too
+MIN_COMPONENT_SIMILARITY = 0.6
+COMPONENT_WEIGHT = 0.7
+MAX_CANDIDATES = 10
+# Grams shared by more rows than this carry no signal and would make lookups quadratic
+MAX_POSTINGS = 200
+
+TOKEN_RE = re.compile(r'[A-Z0-9]+')
+
+
+def clean_value(val):
+    return str(val).strip().upper().replace('\xa0', '')
+
+
+def component_grams(component):
+    padded = f" {component} "
+    return {padded[i:i + NGRAM_SIZE] for i in range(max(len(padded) - NGRAM_SIZE + 1, 1))}
+
+
+def description_tokens(description):
+    return set(TOKEN_RE.findall(description.upper()))
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class RenameIndex:
+    """Inverted n-gram index over one-sided rows, blocked by customer part.
+
+    Each removed row is posted under the trigrams of its component number, so a
+    lookup only scores rows whose component number shares at least one gram with
+    the query instead of every removed row. Descriptions only weigh in on the score.
+    """
+
+    def __init__(self):
+        self.postings = defaultdict(list)
+        self.features = {}
+
+    def add(self, key, description):
+        component, customer_part = key
+        features = (component_grams(component), description_tokens(description))
+        self.features[key] = features
+        for gram in features[0]:
+            self.postings[(customer_part, gram)].append(key)
+
+    def candidates(self, key, description):
+        component, customer_part = key
+        grams, tokens = component_grams(component), description_tokens(description)
+        shared = Counter()
+        for gram in grams:
+            posting = self.postings.get((customer_part, gram), ())
+            if len(posting) <= MAX_POSTINGS:
+                shared.update(posting)
+        for candidate, _ in shared.most_common(MAX_CANDIDATES):
+            candidate_grams, candidate_tokens = self.features[candidate]
+            component_score = jaccard(grams, candidate_grams)
+            if component_score < MIN_COMPONENT_SIMILARITY:
+                continue
+            score = COMPONENT_WEIGHT * component_score + (1 - COMPONENT_WEIGHT) * jaccard(tokens, candidate_tokens)
+            yield score, candidate
+
+
+def pair_renames(added, removed, min_similarity=MIN_RENAME_SIMILARITY):
+    """Pair components only in X with likely renumbered counterparts only in X-N.
+
+    ``added`` and ``removed`` map (component, customer part) keys to their
+    description. Returns a dict of X key -> X-N key; each key is used at most once.
+    """
+    index = RenameIndex()
+    for key, description in removed.items():
+        index.add(key, description)
+
+    scored = [
+        (score, added_key, removed_key)
+        for added_key, description in added.items()
+        for score, removed_key in index.candidates(added_key, description)
+        if score >= min_similarity
+    ]
+
+    pairs = {}
+    paired = set()
+    for score, added_key, removed_key in sorted(scored, key=lambda item: item[0], reverse=True):
+        if added_key not in pairs and removed_key not in paired:
+            pairs[added_key] = removed_key
+            paired.add(removed_key)
+    return pairs
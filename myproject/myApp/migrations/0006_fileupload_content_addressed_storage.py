@@ -0,0 +1,30 @@
+# Generated by Django 5.2.1 on 2026-10-19 15:01
+
+import myApp.models
+import myApp.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myApp', '0005_alter_fileupload_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='fileupload',
+            name='file1',
+            field=models.FileField(storage=myApp.storage.get_upload_storage, upload_to='uploads/', validators=[myApp.models.validate_excel_file]),
+        ),
+        migrations.AlterField(
+            model_name='fileupload',
+            name='file2',
+            field=models.FileField(storage=myApp.storage.get_upload_storage, upload_to='uploads/', validators=[myApp.models.validate_excel_file]),
+        ),
+        migrations.AlterField(
+            model_name='fileupload',
+            name='output',
+            field=models.FileField(blank=True, null=True, storage=myApp.storage.get_upload_storage, upload_to='outputs/'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-19 15:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myApp', '0006_fileupload_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComponentChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week', models.DateField()),
+                ('component', models.CharField(max_length=100)),
+                ('customer_part', models.CharField(max_length=100)),
+                ('previous_component', models.CharField(blank=True, max_length=100)),
+                ('change_type', models.CharField(choices=[('changed', 'Quantity changed'), ('description', 'Description changed'), ('renamed', 'Renamed'), ('added', 'Added'), ('removed', 'Removed')], max_length=20)),
+                ('quantity_x', models.CharField(blank=True, max_length=50)),
+                ('quantity_xn', models.CharField(blank=True, max_length=50)),
+                ('description_x', models.TextField(blank=True)),
+                ('description_xn', models.TextField(blank=True)),
+                ('upload', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='component_changes', to='myApp.fileupload')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['component', 'customer_part'], name='myApp_compo_compone_8f814d_idx'), models.Index(fields=['previous_component'], name='myApp_compo_previou_86ada1_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-19 15:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myApp', '0007_componentchange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='fileupload',
+            name='file1_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='fileupload',
+            name='file2_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
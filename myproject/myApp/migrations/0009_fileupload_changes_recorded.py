@@ -0,0 +1,25 @@
+# Generated by Django 5.2.1 on 2026-10-19 15:38
+
+from django.db import migrations, models
+
+
+def mark_recorded_uploads(apps, schema_editor):
+    # Uploads with timeline entries were recorded; the rest need backfill_timeline
+    FileUpload = apps.get_model('myApp', 'FileUpload')
+    FileUpload.objects.filter(component_changes__isnull=False).update(changes_recorded=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myApp', '0008_fileupload_original_names_storedblob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileupload',
+            name='changes_recorded',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_recorded_uploads, migrations.RunPython.noop),
+    ]
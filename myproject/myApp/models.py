@@ -1,17 +1,74 @@
-from django.db import models 
+import os
+from django.db import models, transaction
 from django.core.exceptions import ValidationError
+from .storage import get_upload_storage
 
 def validate_excel_file(file):
     if not file.name.endswith(('.xls', '.xlsx')):
         raise ValidationError('Only Excel files are allowed (.xls, .xlsx)')
 
 class FileUpload(models.Model):
-    file1 = models.FileField(upload_to='uploads/', validators=[validate_excel_file])
+    file1 = models.FileField(upload_to='uploads/', storage=get_upload_storage, validators=[validate_excel_file])
+    file1_name = models.CharField(max_length=255, blank=True)  # Name BOOM(X) was uploaded under
     date1 = models.DateField(blank=False)  # Required date from user
-    file2 = models.FileField(upload_to='uploads/', validators=[validate_excel_file])
+    file2 = models.FileField(upload_to='uploads/', storage=get_upload_storage, validators=[validate_excel_file])
+    file2_name = models.CharField(max_length=255, blank=True)  # Name BOOM(X-N) was uploaded under
     date2 = models.DateField(blank=False)  # Required date from user
-    output = models.FileField(upload_to='outputs/', blank=True, null=True)
+    output = models.FileField(upload_to='outputs/', storage=get_upload_storage, blank=True, null=True)
+    changes_recorded = models.BooleanField(default=False)  # Timeline entries stored for the output
 
+    def save(self, *args, **kwargs):
+        # Stored names are content hashes, keep the names the files were uploaded under
+        for field in ('file1', 'file2'):
+            file = getattr(self, field)
+            if file and not file._committed:
+                setattr(self, f'{field}_name', os.path.basename(file.name))
+        # The storage locks reused blobs until the row pointing at them is committed
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def original_name(self, field):
+        file = getattr(self, field)
+        return getattr(self, f'{field}_name') or os.path.basename(file.name)
+
+    def __str__(self):
+        return f"Upload {self.id} - File1: {self.date1}, File2: {self.date2}"
+
+
+class StoredBlob(models.Model):
+    """Lock row of a stored blob, serializing its reuse by new uploads against its deletion"""
+    name = models.CharField(max_length=255, primary_key=True)
+
+    def __str__(self):
+        return self.name
+
+
+class ComponentChange(models.Model):
+    """One changed component of an upload's comparison, the index behind the component timeline"""
+    CHANGE_TYPES = [
+        ('changed', 'Quantity changed'),
+        ('description', 'Description changed'),
+        ('renamed', 'Renamed'),
+        ('added', 'Added'),
+        ('removed', 'Removed'),
+    ]
+
+    upload = models.ForeignKey(FileUpload, on_delete=models.CASCADE, related_name='component_changes')
+    week = models.DateField()  # KW(X) of the upload
+    component = models.CharField(max_length=100)
+    customer_part = models.CharField(max_length=100)
+    previous_component = models.CharField(max_length=100, blank=True)  # X-N component of a rename
+    change_type = models.CharField(max_length=20, choices=CHANGE_TYPES)
+    quantity_x = models.CharField(max_length=50, blank=True)
+    quantity_xn = models.CharField(max_length=50, blank=True)
+    description_x = models.TextField(blank=True)
+    description_xn = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['component', 'customer_part']),
+            models.Index(fields=['previous_component']),
+        ]
 
     def __str__(self):
-        return f"Upload {self.id} - File1: {self.date1}, File2: {self.date2}"
\ No newline at end of file
+        return f"{self.component} ({self.customer_part}) {self.change_type} in upload {self.upload_id}"
@@ -0,0 +1,108 @@
+import os
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import FileUpload
+from .storage import upload_storage, release_files, release_blob
+from .sidecar import SIDECAR_SUFFIXES
+
+
+RETENTION_DEFAULTS = {
+    'MAX_AGE_DAYS': None,          # Delete uploads whose KW(X) is older than this
+    'MAX_COUNT': None,             # Keep only the newest N uploads
+    'ORPHAN_GRACE_HOURS': 24,      # Leave unreferenced files alone while a request may still save them
+    'BATCH_SIZE': 200,
+}
+
+MEDIA_DIRS = ('uploads', 'outputs')
+
+
+def get_policy(**overrides):
+    policy = dict(RETENTION_DEFAULTS, **getattr(settings, 'UPLOAD_RETENTION', {}))
+    policy.update({key: value for key, value in overrides.items() if value is not None})
+    return policy
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def expired_upload_ids(policy):
+    """Ids of uploads falling outside the age or count policy, oldest first"""
+    expired = set()
+    if policy['MAX_AGE_DAYS'] is not None:
+        cutoff = timezone.now().date() - timedelta(days=policy['MAX_AGE_DAYS'])
+        expired.update(FileUpload.objects.filter(date1__lt=cutoff).values_list('id', flat=True))
+    if policy['MAX_COUNT'] is not None:
+        expired.update(
+            FileUpload.objects.order_by('-id').values_list('id', flat=True)[policy['MAX_COUNT']:]
+        )
+    return sorted(expired)
+
+
+def purge_uploads(upload_ids, batch_size, dry_run=False):
+    """Delete uploads batch by batch, each in its own short transaction"""
+    deleted = 0
+    for batch in batched(upload_ids, batch_size):
+        if dry_run:
+            deleted += len(batch)
+            continue
+        with transaction.atomic():
+            uploads = FileUpload.objects.select_for_update().filter(id__in=batch)
+            stored_names = [name for row in uploads.values_list('file1', 'file2', 'output') for name in row]
+            deleted += uploads.delete()[1].get(FileUpload._meta.label, 0)
+        release_files(*stored_names)
+    return deleted
+
+
+def referenced_names(batch_size):
+    names = set()
+    rows = FileUpload.objects.values_list('file1', 'file2', 'output').iterator(chunk_size=batch_size)
+    for row in rows:
+        names.update(filter(None, row))
+    return names
+
+
+def find_orphans(policy):
+    """Stored files under the media tree that no FileUpload row points at"""
+    referenced = referenced_names(policy['BATCH_SIZE'])
+    cutoff = time.time() - policy['ORPHAN_GRACE_HOURS'] * 3600
+    orphans = []
+    for media_dir in MEDIA_DIRS:
+        root = os.path.join(upload_storage.location, media_dir)
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, upload_storage.location).replace(os.sep, '/')
+                owner = next((name[:-len(suffix)] for suffix in SIDECAR_SUFFIXES if name.endswith(suffix)), name)
+                if owner not in referenced and os.path.getmtime(path) < cutoff:
+                    orphans.append(name)
+    return sorted(orphans)
+
+
+def delete_orphans(names, dry_run=False):
+    """Delete orphaned files; returns how many were removed.
+
+    The scan is a snapshot, a new upload may have reused a blob since, so each
+    blob is re-counted under its lock before it goes. Sidecars are only removed
+    once their workbook is gone.
+    """
+    if dry_run:
+        return len(names)
+    sidecars = [name for name in names if name.endswith(SIDECAR_SUFFIXES)]
+    removed = sum(release_blob(name) for name in names if not name.endswith(SIDECAR_SUFFIXES))
+    for name in sidecars:
+        owner = next(name[:-len(suffix)] for suffix in SIDECAR_SUFFIXES if name.endswith(suffix))
+        if not upload_storage.exists(owner) and upload_storage.exists(name):
+            upload_storage.delete(name)
+            removed += 1
+    return removed
@@ -1,7 +1,15 @@
 from rest_framework import serializers
-from .models import FileUpload
+from .models import FileUpload, ComponentChange
 
 class FileUploadSerializer(serializers.ModelSerializer):
     class Meta:
         model = FileUpload
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+        read_only_fields = ['file1_name', 'file2_name', 'changes_recorded']
+
+
+class ComponentChangeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ComponentChange
+        fields = ['upload', 'week', 'component', 'customer_part', 'previous_component', 'change_type',
+                  'quantity_x', 'quantity_xn', 'description_x', 'description_xn']
@@ -0,0 +1,106 @@
+import json
+import os
+import tempfile
+import numpy as np
+
+
+SIDECAR_VERSION = 2
+TABLE_SUFFIX = '.bom.npy'
+OFFSETS_SUFFIX = '.bom.offsets.npy'
+META_SUFFIX = '.bom.json'
+SIDECAR_SUFFIXES = (TABLE_SUFFIX, OFFSETS_SUFFIX, META_SUFFIX)
+
+
+class StringTable:
+    """Rows of named string fields kept as one UTF-8 buffer plus int32 offsets per column.
+
+    Column ``i`` holds the cells ``buffer[offsets[i, r]:offsets[i, r + 1]]``, so the
+    table costs its text plus four bytes a cell instead of padding every cell to the
+    longest value, and a range of rows is one contiguous slice of each column.
+    """
+
+    def __init__(self, fields, buffer, offsets):
+        self.fields = tuple(fields)
+        self.buffer = buffer
+        self.offsets = offsets
+
+    @classmethod
+    def from_columns(cls, fields, columns):
+        encoded = [[str(value).encode() for value in column] for column in columns]
+        rows = len(encoded[0]) if encoded else 0
+        ends = np.cumsum([len(value) for column in encoded for value in column], dtype=np.int64)
+        if ends.size and ends[-1] > np.iinfo(np.int32).max:
+            raise ValueError("Workbook too large: its text does not fit a BOM table.")
+        bounds = np.concatenate(([0], ends)).astype(np.int32)
+        offsets = np.stack([bounds[i * rows:(i + 1) * rows + 1] for i in range(len(encoded))])
+        buffer = np.frombuffer(b''.join(value for column in encoded for value in column), dtype=np.uint8)
+        return cls(fields, buffer, offsets)
+
+    def __len__(self):
+        return self.offsets.shape[1] - 1
+
+    def column(self, field, start=0, stop=None):
+        """Decoded cells of one field for rows[start:stop]"""
+        start, stop, _ = slice(start, stop).indices(len(self))
+        bounds = self.offsets[self.fields.index(field), start:max(stop, start) + 1].tolist()
+        raw = self.buffer[bounds[0]:bounds[-1]].tobytes()
+        return [raw[a - bounds[0]:b - bounds[0]].decode() for a, b in zip(bounds, bounds[1:])]
+
+    def records(self, start=0, stop=None):
+        """rows[start:stop] as dicts keyed by field"""
+        columns = [self.column(field, start, stop) for field in self.fields]
+        return [dict(zip(self.fields, row)) for row in zip(*columns)]
+
+
+
+
+def sidecar_paths(path):
+    return path + TABLE_SUFFIX, path + OFFSETS_SUFFIX, path + META_SUFFIX
+
+
+def write_sidecar(path, columns, table):
+    """Store a parsed BOM next to its workbook as two NumPy arrays plus a small JSON header.
+
+    Each file is written to a unique temporary name and renamed into place, the
+    JSON last, so readers never see a half-written sidecar and comparison threads
+    storing the same BOM at once do not write into each other's files.
+    """
+    table_path, offsets_path, meta_path = sidecar_paths(path)
+    meta = {'version': SIDECAR_VERSION, 'columns': columns, 'fields': list(table.fields)}
+    for target, write in (
+        (table_path, lambda f: np.save(f, table.buffer, allow_pickle=False)),
+        (offsets_path, lambda f: np.save(f, table.offsets, allow_pickle=False)),
+        (meta_path, lambda f: f.write(json.dumps(meta).encode())),
+    ):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(tmp_path, target)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+
+def load_sidecar(path):
+    """(columns, table) of a stored BOM with the table memory-mapped read-only, or None"""
+    table_path, offsets_path, meta_path = sidecar_paths(path)
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get('version') != SIDECAR_VERSION:
+            return None
+        table = StringTable(
+            meta['fields'],
+            np.load(table_path, mmap_mode='r', allow_pickle=False),
+            np.load(offsets_path, mmap_mode='r', allow_pickle=False),
+        )
+        return meta['columns'], table
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def delete_sidecar(path):
+    for sidecar_path in sidecar_paths(path):
+        if os.path.exists(sidecar_path):
+            os.remove(sidecar_path)
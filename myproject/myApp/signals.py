@@ -0,0 +1,15 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import FileUpload
+from .caching import invalidate_uploads_list, invalidate_comparison_preview
+
+
+@receiver([post_save, post_delete], sender=FileUpload)
+def upload_written(sender, instance, **kwargs):
+    invalidate_uploads_list()
+    invalidate_comparison_preview(instance.id)
+    # The row, its output and its timeline entries commit later, and a request reading
+    # in between may have cached the previous state
+    transaction.on_commit(invalidate_uploads_list)
+    transaction.on_commit(lambda: invalidate_comparison_preview(instance.id))
@@ -0,0 +1,79 @@
+import hashlib
+import posixpath
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import Q
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Stores each distinct file once, named after the SHA-256 of its content.
+
+    Saving content that is already stored returns the existing name instead of
+    writing a second copy, so several FileUpload rows can share one blob. The
+    blob's lock row stays locked until the caller's transaction commits, so a
+    concurrent release_files cannot delete a blob that is about to be reused.
+    """
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        name = posixpath.join(directory, digest[:2], digest + extension)
+
+        with transaction.atomic():
+            lock_blob(name)
+            if self.exists(name):
+                return name
+            return super()._save(name, content)
+
+
+upload_storage = ContentAddressedStorage()
+
+
+def get_upload_storage():
+    return upload_storage
+
+
+def lock_blob(name):
+    """Lock the blob's row for the rest of the current transaction"""
+    from .models import StoredBlob
+
+    StoredBlob.objects.select_for_update().get_or_create(name=name)
+
+
+def reference_count(name):
+    """Number of uploads whose file1, file2 or output points at the stored blob"""
+    from .models import FileUpload
+
+    return FileUpload.objects.filter(Q(file1=name) | Q(file2=name) | Q(output=name)).count()
+
+
+def release_blob(name):
+    """Delete a blob, its BOM sidecar and its lock row unless an upload references it.
+
+    Runs in its own transaction holding the blob's lock, so an upload reusing
+    the blob either commits first and is counted, or stores the file again.
+    Returns whether the blob was deleted.
+    """
+    from .sidecar import delete_sidecar  # Keeps numpy out of model import
+    from .models import StoredBlob
+
+    with transaction.atomic():
+        lock_blob(name)
+        if reference_count(name):
+            return False
+        upload_storage.delete(name)
+        delete_sidecar(upload_storage.path(name))
+        StoredBlob.objects.filter(name=name).delete()
+    return True
+
+
+def release_files(*names):
+    """Delete every given blob, and its BOM sidecar, once no upload references it"""
+    # One blob per transaction, so a release never holds more than one lock at a time
+    for name in sorted(set(filter(None, names))):
+        release_blob(name)
@@ -1,12 +1,77 @@
 import io
+import json
 import os
-from django.test import TestCase, Client
+import random
+import re
+import signal
+import tempfile
+import threading
+import zipfile
+from openpyxl import load_workbook
+from unittest import mock
+from openpyxl import Workbook
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
+from django.core.files import File
 from django.core.files.uploadedfile import SimpleUploadedFile
-from .models import FileUpload
-from .utils import clean_value, build_data_dict
+from django.core.management import call_command
+from django.core.cache import cache
+from .models import FileUpload, StoredBlob
+from .views import validate_excel_headers
+from . import views
+from .utils import clean_value, build_data_dict, read_excel_with_detected_header, generate_output, classify_changes, EXPECTED_HEADERS
+from .utils import data_dict_to_table, table_to_data_dict, check_sheet_limits
+from . import utils
+from .storage import upload_storage
+from .matching import pair_renames
+from .xlsx import sheet_stats, iter_sheet_rows
+from .sidecar import load_sidecar, write_sidecar, sidecar_paths
+from . import concurrency
+from .loadtest import build_synthetic_bom, percentile, is_error, PlannerSession, ID_REFRESH_EVERY
+from . import retention
+from . import caching
+from . import exports
+from asgiref.sync import sync_to_async
 from datetime import date
 
+def write_bom(path, rows, preamble=(("BOM export", "Sitz Rechts VE"), ())):
+    """Write a minimal BOM workbook with a preamble above the header row"""
+    wb = Workbook()
+    ws = wb.active
+    for line in preamble:
+        ws.append(list(line))
+    ws.append(EXPECTED_HEADERS)
+    for component, customer_part, quantity, description in rows:
+        ws.append(["P1", "PN1", "1000", customer_part, "Harness", "S1",
+                   component, None, "G1", description, "PC", quantity])
+    wb.save(path)
+    return path
+
+
+def create_upload(content1=b'x', content2=b'xn', name1="x.xlsx", name2="xn.xlsx"):
+    return FileUpload.objects.create(
+        file1=SimpleUploadedFile(name1, content1),
+        file2=SimpleUploadedFile(name2, content2),
+        date1=date(2025, 5, 19),
+        date2=date(2025, 5, 12)
+    )
+
+
+class MediaRootMixin:
+    """Stores the files a test writes in a temporary MEDIA_ROOT"""
+
+    def setUp(self):
+        super().setUp()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.override = override_settings(MEDIA_ROOT=self.tmpdir.name)
+        self.override.enable()
+
+    def tearDown(self):
+        self.override.disable()
+        self.tmpdir.cleanup()
+        super().tearDown()
+
+
 class FileUploadTests(TestCase):
     def setUp(self):
         self.client = Client()
@@ -52,6 +117,19 @@ class FileUploadTests(TestCase):
         self.assertIn(('B2', 'D2'), result)
         self.assertNotIn((None, 'E3'), result)
 
+    def test_bom_table_round_trip(self):
+        data = {
+            ('A1', 'C1'): {'Quantity': '10.0', 'Description': 'desc 1', 'Mat. Group': 'G1'},
+            ('B2', 'D2'): {'Quantity': '', 'Description': 'Kabelbaum Sitz größer', 'Mat. Group': ''},
+        }
+        table = data_dict_to_table(data)
+        self.assertEqual(table.fields, ('component', 'customer_part', 'quantity', 'description', 'group'))
+        self.assertEqual(table_to_data_dict(table), data)
+        self.assertEqual(table.records(1, 5), [{'component': 'B2', 'customer_part': 'D2', 'quantity': '',
+                                                'description': 'Kabelbaum Sitz größer', 'group': ''}])
+        self.assertEqual(table.records(3), [])
+        self.assertEqual(table_to_data_dict(data_dict_to_table({})), {})
+
     def test_delete_upload(self):
         upload = FileUpload.objects.create(
             file1=self.file1,
@@ -90,6 +168,16 @@ class FileUploadTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response['Content-Type'], 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
 
+    def test_upload_status(self):
+        upload = FileUpload.objects.create(
+            file1=self.file1,
+            file2=self.file2,
+            date1=date(2025, 5, 19),
+            date2=date(2025, 5, 12)
+        )
+        response = self.client.get(reverse('upload_status', args=[upload.id]))
+        self.assertEqual(response.json(), {'id': upload.id, 'ready': False, 'download_url': None})
+
     def test_api_get(self):
         response = self.client.get(reverse('api-uploads'))
         self.assertEqual(response.status_code, 200)
@@ -102,3 +190,500 @@ class FileUploadTests(TestCase):
             'date2': '2025-05-12',
         }, format='multipart')
         self.assertIn(response.status_code, [200, 201])
+
+
+class HeaderDetectionTests(TestCase):
+    def setUp(self):
+        utils._header_cache.clear()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = write_bom(os.path.join(self.tmpdir.name, 'bom.xlsx'),
+                              [('A1', 'C1', 10, 'desc1'), ('B2', 'D2', 20, 'desc2')])
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_detects_header_below_preamble(self):
+        df = read_excel_with_detected_header(self.path)
+        self.assertEqual(df.columns.tolist(), EXPECTED_HEADERS)
+        self.assertEqual(len(df), 2)
+
+    def test_validate_headers_reads_detected_header_row(self):
+        other = write_bom(os.path.join(self.tmpdir.name, 'other.xlsx'), [('C3', 'E3', 5, 'desc3')],
+                          preamble=[("Different", "preamble", "length")] * 4)
+        with open(self.path, 'rb') as file1, open(other, 'rb') as file2:
+            self.assertTrue(validate_excel_headers(file1, file2))
+            self.assertEqual(file1.tell(), 0)
+
+    def test_validate_headers_detects_mismatch(self):
+        wb = Workbook()
+        wb.active.append(EXPECTED_HEADERS[:-1] + ["Quantity"])
+        mismatched = os.path.join(self.tmpdir.name, 'mismatched.xlsx')
+        wb.save(mismatched)
+        with open(self.path, 'rb') as file1, open(mismatched, 'rb') as file2:
+            with self.assertRaisesMessage(ValueError, "Header mismatch"):
+                validate_excel_headers(file1, file2)
+
+    def test_sheet_rows_without_references(self):
+        sheet = (
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            '<row><c t="inlineStr"><is><t>a</t></is></c><c><v>1</v></c></row>'
+            '<row><c><v>2</v></c></row>'
+            '</sheetData></worksheet>'
+        )
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            archive.writestr('xl/worksheets/sheet1.xml', sheet)
+        with zipfile.ZipFile(buffer) as archive:
+            rows = list(iter_sheet_rows(archive, 'xl/worksheets/sheet1.xml'))
+        self.assertEqual(rows, [(0, {0: ('inlineStr', 'a'), 1: ('n', '1')}), (1, {0: ('n', '2')})])
+
+    def test_sheet_stats_read_from_metadata(self):
+        size, rows = sheet_stats(self.path)
+        with zipfile.ZipFile(self.path) as archive:
+            self.assertEqual(size, archive.getinfo('xl/worksheets/sheet1.xml').file_size)
+        self.assertEqual(rows, 5)
+
+        # Excel keeps text cells in the shared strings, which count towards the sheet's size
+        with zipfile.ZipFile(self.path, 'a') as archive:
+            archive.writestr('xl/sharedStrings.xml', b'<sst/>' * 1000, compress_type=zipfile.ZIP_DEFLATED)
+        self.assertEqual(sheet_stats(self.path), (size + 6000, 5))
+
+    @override_settings(COMPARISON_MAX_ROWS=3, COMPARISON_PARSE_WORKERS=1)
+    def test_row_limit_enforced_without_dimension(self):
+        path = os.path.join(os.path.dirname(self.path), 'nodim.xlsx')
+        with zipfile.ZipFile(self.path) as source, zipfile.ZipFile(path, 'w') as target:
+            for item in source.infolist():
+                content = source.read(item)
+                if item.filename == 'xl/worksheets/sheet1.xml':
+                    content = re.sub(rb'<dimension[^>]*/>', b'', content)
+                target.writestr(item, content)
+        self.assertEqual(sheet_stats(path)[1], None)
+        check_sheet_limits(path)
+        with self.assertRaisesMessage(ValueError, "has more than 3 rows"):
+            utils.load_boms(path)
+
+    @override_settings(COMPARISON_MAX_ROWS=3)
+    def test_oversized_upload_rejected_before_parsing(self):
+        with open(self.path, 'rb') as f:
+            content = f.read()
+        busy = threading.BoundedSemaphore(1)
+        busy.acquire()
+        # Rejected by the cheap metadata check, not after waiting for a comparison slot
+        with mock.patch.object(utils, 'peek_header') as peek, \
+                mock.patch.object(concurrency, 'comparison_slots', busy), \
+                override_settings(COMPARISON_QUEUE_TIMEOUT=0):
+            response = self.client.post(reverse('index'), {
+                'date1': '2025-W21',
+                'date2': '2025-W20',
+                'file1': SimpleUploadedFile("bom_KW21.xlsx", content),
+                'file2': SimpleUploadedFile("bom_KW20.xlsx", content),
+            })
+        peek.assert_not_called()
+        self.assertContains(response, "Workbook too large")
+        self.assertFalse(FileUpload.objects.exists())
+
+    @override_settings(COMPARISON_QUEUE_TIMEOUT=0)
+    def test_busy_server_turns_comparisons_away(self):
+        with mock.patch.object(concurrency, 'comparison_slots', threading.BoundedSemaphore(1)):
+            with concurrency.comparison_slot():
+                with self.assertRaisesMessage(ValueError, "Server busy"):
+                    with concurrency.comparison_slot():
+                        pass
+            with concurrency.comparison_slot():
+                pass
+
+    def test_known_template_skips_detection(self):
+        read_excel_with_detected_header(self.path)
+        self.assertEqual(len(utils._header_cache), 1)
+
+        other = write_bom(os.path.join(self.tmpdir.name, 'other.xlsx'), [('C3', 'E3', 5, 'desc3')])
+        with mock.patch.object(utils, 'score_header_rows') as score:
+            df = read_excel_with_detected_header(other)
+        score.assert_not_called()
+        self.assertEqual(df['Component No.'].tolist(), ['C3'])
+
+
+class ContentAddressedStorageTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = b'PK\x03\x04 same weekly BOM'
+
+    def create_upload(self):
+        return create_upload(self.content, self.content, "KW21.xlsx", "KW20.xlsx")
+
+    def test_identical_content_is_stored_once(self):
+        first = self.create_upload()
+        second = self.create_upload()
+        self.assertEqual(first.file1.name, second.file2.name)
+        blob_dir = os.path.dirname(upload_storage.path(first.file1.name))
+        self.assertEqual(len(os.listdir(blob_dir)), 1)
+
+    def test_delete_keeps_shared_blob_until_last_reference(self):
+        first = self.create_upload()
+        second = self.create_upload()
+        path = first.file1.path
+
+        self.client.get(reverse('delete_upload', args=[first.id]))
+        self.assertTrue(os.path.exists(path))
+
+        self.client.get(reverse('delete_upload', args=[second.id]))
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(StoredBlob.objects.filter(name=first.file1.name).exists())
+
+    def test_download_uses_uploaded_name(self):
+        upload = self.create_upload()
+        self.assertTrue(StoredBlob.objects.filter(name=upload.file1.name).exists())
+        self.assertEqual(upload.file2_name, "KW20.xlsx")
+
+        response = self.client.get(reverse('download_input', args=[upload.id, 'xn']))
+        self.assertIn('filename="KW20.xlsx"', response['Content-Disposition'])
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_missing_files_are_not_server_errors(self):
+        upload = self.create_upload()
+        upload.output.save('output.xlsx', SimpleUploadedFile('output.xlsx', b'PK output'))
+        os.remove(upload.file1.path)
+        os.remove(upload.output.path)
+
+        self.assertEqual(self.client.get(reverse('download_input', args=[upload.id, 'x'])).status_code, 404)
+        response = self.client.get(reverse('download_output', args=[upload.id]))
+        self.assertRedirects(response, reverse('upload_tables'), fetch_redirect_response=False)
+
+
+class RetentionTests(MediaRootMixin, TestCase):
+    def test_keep_newest_uploads(self):
+        uploads = [create_upload(f'bom {i}'.encode(), f'bom {i}-old'.encode()) for i in range(3)]
+        call_command('purge_uploads', keep=1, batch_size=1, skip_orphans=True, stdout=io.StringIO())
+        self.assertEqual(list(FileUpload.objects.values_list('id', flat=True)), [uploads[-1].id])
+        self.assertFalse(upload_storage.exists(uploads[0].file1.name))
+
+    def test_orphan_scan_ignores_referenced_files(self):
+        upload = create_upload(b'bom', b'bom-old')
+        orphan = upload_storage.save('outputs/left_over.xlsx', SimpleUploadedFile('left_over.xlsx', b'old output'))
+        policy = retention.get_policy(ORPHAN_GRACE_HOURS=0)
+        os.utime(upload_storage.path(orphan), (0, 0))
+        self.assertEqual(retention.find_orphans(policy), [orphan])
+
+    def test_orphan_reused_after_scan_is_kept(self):
+        orphan = upload_storage.save('uploads/bom.xlsx', SimpleUploadedFile('bom.xlsx', b'bom'))
+        os.utime(upload_storage.path(orphan), (0, 0))
+        orphans = retention.find_orphans(retention.get_policy(ORPHAN_GRACE_HOURS=0))
+
+        upload = create_upload(b'bom', b'bom-old')
+        self.assertEqual(upload.file1.name, orphan)
+        self.assertEqual(retention.delete_orphans(orphans), 0)
+        self.assertTrue(upload_storage.exists(orphan))
+
+
+class GenerateOutputTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.file1_path = write_bom(os.path.join(self.tmpdir.name, 'x.xlsx'), [
+            ('A1', 'C1', 10, 'desc1'), ('B2', 'D2', 25, 'desc2'), ('N3', 'E3', 1, 'new'),
+        ])
+        self.file2_path = write_bom(os.path.join(self.tmpdir.name, 'xn.xlsx'), [
+            ('A1', 'C1', 10, 'desc1'), ('B2', 'D2', 20, 'desc2'), ('O4', 'F4', 2, 'old'),
+        ])
+        self.upload = create_upload()
+
+    def save_comparison(self):
+        views.save_comparison(self.upload, *generate_output(self.file1_path, self.file2_path, self.upload))
+
+    def comparison_rows(self, mode):
+        output_path, _, _ = generate_output(self.file1_path, self.file2_path, self.upload, mode=mode)
+        wb = load_workbook(output_path)
+        rows = [row[0] or row[5] for row in wb['Comparison'].iter_rows(min_row=3, values_only=True)]
+        return wb, rows
+
+    def test_full_mode_lists_every_component(self):
+        wb, rows = self.comparison_rows('full')
+        self.assertEqual(rows, ['A1', 'B2', 'N3', 'O4'])
+        self.assertEqual(wb.sheetnames, ['Comparison'])
+
+    def test_comparison_preview_is_cached_until_update(self):
+        # Quantity and description both edited, counted once as in the Summary sheet
+        write_bom(self.file1_path, [('A1', 'C1', 10, 'desc1'), ('B2', 'D2', 25, 'desc2 rev'), ('N3', 'E3', 1, 'new')])
+        self.save_comparison()
+        cache.clear()
+
+        response = self.client.get(reverse('comparison_preview', args=[self.upload.id]))
+        self.assertEqual(response.json()['summary'], {
+            'changed': 1, 'description': 0, 'renamed': 0, 'added': 1, 'removed': 1, 'total': 3,
+        })
+        self.assertEqual(response.json()['rows'][0]['component'], 'B2')
+        with mock.patch.object(caching, 'build_comparison_preview') as build:
+            self.client.get(reverse('comparison_preview', args=[self.upload.id]))
+        build.assert_not_called()
+
+        self.upload.save()
+        self.assertIsNone(cache.get(f'myApp:comparison-preview:{self.upload.id}'))
+
+    def test_component_timeline_records_only_changes(self):
+        generate_output(self.file1_path, self.file2_path, self.upload)
+        self.assertEqual(self.upload.component_changes.count(), 0)
+
+        self.save_comparison()
+        self.assertEqual(self.upload.component_changes.count(), 3)
+
+        response = self.client.get(reverse('api-component-timeline', args=['b2']), {'customer_part': 'D2'})
+        self.assertEqual(len(response.json()), 1)
+        self.assertEqual(response.json()[0]['change_type'], 'changed')
+        self.assertEqual(response.json()[0]['quantity_xn'], '20')
+
+        self.save_comparison()
+        self.assertEqual(self.upload.component_changes.count(), 3)
+
+    def test_outputs_without_timeline_are_backfilled(self):
+        for field, path in (('file1', self.file1_path), ('file2', self.file2_path)):
+            with open(path, 'rb') as f:
+                getattr(self.upload, field).save(os.path.basename(path), File(f), save=True)
+        # An output stored before the component timeline existed
+        output_path, output_filename, _ = generate_output(self.upload.file1.path, self.upload.file2.path, self.upload)
+        with open(output_path, 'rb') as f:
+            self.upload.output.save(output_filename, File(f), save=True)
+
+        response = self.client.get(reverse('comparison_preview', args=[self.upload.id]))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['error'], "No recorded changes for this upload.")
+        response = self.client.get(reverse('export_changes', args=[self.upload.id, 'csv']))
+        self.assertEqual(response.status_code, 404)
+
+        call_command('backfill_timeline', stdout=io.StringIO())
+        response = self.client.get(reverse('comparison_preview', args=[self.upload.id]))
+        self.assertEqual(response.json()['summary']['total'], 3)
+
+    def test_full_report_download_leaves_timeline_alone(self):
+        for field, path in (('file1', self.file1_path), ('file2', self.file2_path)):
+            with open(path, 'rb') as f:
+                getattr(self.upload, field).save(os.path.basename(path), File(f), save=True)
+        self.save_comparison()
+        entries = list(self.upload.component_changes.values_list('id', flat=True))
+
+        # What download_output?variant=full runs on the comparison executor
+        report = views.build_full_report(self.upload)
+        self.assertEqual(load_workbook(io.BytesIO(report)).sheetnames, ['Comparison'])
+        self.assertEqual(list(self.upload.component_changes.values_list('id', flat=True)), entries)
+
+    def test_conditional_style_uses_sheet_rules(self):
+        output_path, _, _ = generate_output(self.file1_path, self.file2_path, self.upload, style='conditional')
+        ws = load_workbook(output_path)['Comparison']
+        statuses = [row[0] for row in ws.iter_rows(min_row=3, min_col=10, max_col=10, values_only=True)]
+        self.assertEqual(statuses, ['unchanged', 'changed', 'added', 'removed'])
+        self.assertTrue(ws.column_dimensions['J'].hidden)
+        self.assertFalse(any(cell.fill.fill_type for row in ws.iter_rows(min_row=3) for cell in row))
+        rules = {(str(cf.sqref), rule.formula[0]) for cf in ws.conditional_formatting for rule in cf.rules}
+        self.assertEqual(rules, {
+            ('A3:A6 F3:F6', '$J3="renamed"'),
+            ('A3:C6 F3:H6', 'AND($A3<>"",$F3<>"",NOT(EXACT($C3,$H3)))'),
+            ('D3:D6 I3:I6', 'AND($A3<>"",$F3<>"",NOT(EXACT($D3,$I3)))'),
+            ('A3:A6 D3:D6', 'AND($J3="added",$A3<>"")'),
+            ('F3:F6 I3:I6', 'AND($J3="removed",$F3<>"")'),
+            ('A3:I6', 'TRUE'),
+        })
+
+    def test_conditional_style_flags_case_only_description_change(self):
+        write_bom(self.file1_path, [('A1', 'C1', 10, 'desc1'), ('B2', 'D2', 20, 'DESC2'), ('N3', 'E3', 1, 'new')])
+        output_path, _, _ = generate_output(self.file1_path, self.file2_path, self.upload, style='conditional')
+        ws = load_workbook(output_path)['Comparison']
+        b2 = next(row for row in ws.iter_rows(min_row=3, values_only=True) if row[0] == 'B2')
+        self.assertEqual((b2[3], b2[8], b2[9]), ('DESC2', 'desc2', 'description'))
+
+    def test_parsed_boms_are_reused_from_sidecar(self):
+        generate_output(self.file1_path, self.file2_path, self.upload)
+        self.assertTrue(os.path.exists(self.file1_path + '.bom.npy'))
+
+        with mock.patch.object(utils, 'parse_boms') as parse:
+            generate_output(self.file1_path, self.file2_path, self.upload)
+        parse.assert_not_called()
+
+    @override_settings(COMPARISON_PARSE_WORKERS=2)
+    def test_parse_pool_replaced_after_worker_dies(self):
+        executor = concurrency.get_parse_executor()
+        executor.submit(os.getpid).result()
+        for pid in list(executor._processes):
+            os.kill(pid, signal.SIGKILL)
+
+        with mock.patch.object(utils, 'reset_parse_executor', wraps=concurrency.reset_parse_executor) as reset:
+            (columns, table), = utils.parse_boms(self.file1_path)
+        reset.assert_called_once_with(executor)
+        self.assertEqual(len(table), 3)
+        self.assertIsNot(concurrency.get_parse_executor(), executor)
+
+    @override_settings(COMPARISON_MAX_ROWS=3)
+    def test_full_report_and_bom_api_apply_sheet_limits(self):
+        for field, path in (('file1', self.file1_path), ('file2', self.file2_path)):
+            with open(path, 'rb') as f:
+                getattr(self.upload, field).save(os.path.basename(path), File(f), save=True)
+
+        with self.assertRaisesMessage(ValueError, "Workbook too large"):
+            views.build_full_report(self.upload)
+        response = self.client.get(reverse('api-upload-bom', args=[self.upload.id, 'x']))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Workbook too large", response.json()['error'])
+
+    @override_settings(COMPARISON_QUEUE_TIMEOUT=0)
+    def test_bom_api_parse_waits_for_comparison_slot(self):
+        with open(self.file1_path, 'rb') as f:
+            self.upload.file1.save('x.xlsx', File(f), save=True)
+        busy = threading.BoundedSemaphore(1)
+        busy.acquire()
+        with mock.patch.object(concurrency, 'comparison_slots', busy):
+            response = self.client.get(reverse('api-upload-bom', args=[self.upload.id, 'x']))
+        self.assertEqual(response.status_code, 503)
+
+    def test_concurrent_sidecar_writes(self):
+        columns, table = utils.parse_bom(self.file1_path)
+        threads = [threading.Thread(target=write_sidecar, args=(self.file1_path, columns, table)) for _ in range(8)]
+        with mock.patch('threading.excepthook') as excepthook:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        excepthook.assert_not_called()
+        self.assertEqual(len(load_sidecar(self.file1_path)[1]), 3)
+        self.assertFalse([name for name in os.listdir(self.tmpdir.name) if name.endswith('.tmp')])
+
+    def test_sidecar_stores_text_without_padding(self):
+        # One long description would pad every cell of a fixed-width column to its length
+        data = {(f'C{i}', f'P{i}'): {'Quantity': '1', 'Description': 'desc', 'Mat. Group': 'G1'} for i in range(2000)}
+        data['C0', 'P0']['Description'] = 'x' * 500
+        write_sidecar(self.file1_path, ['columns'], data_dict_to_table(data))
+        size = sum(os.path.getsize(path) for path in sidecar_paths(self.file1_path))
+        self.assertLess(size, 80 * 1024)
+        columns, table = load_sidecar(self.file1_path)
+        self.assertEqual(table_to_data_dict(table), data)
+
+    def test_bom_rows_api_reads_sidecar(self):
+        bom = write_bom(os.path.join(self.tmpdir.name, 'api.xlsx'), [('A1', 'C1', 10, 'desc1'), ('B2', 'D2', 25, 'desc2')])
+        with open(bom, 'rb') as f:
+            self.upload.file1.save('api.xlsx', File(f), save=True)
+        response = self.client.get(reverse('api-upload-bom', args=[self.upload.id, 'x']), {'offset': 1})
+        self.assertEqual(response.json()['count'], 2)
+        self.assertEqual(response.json()['rows'][0]['component'], 'B2')
+        self.assertTrue(os.path.exists(self.upload.file1.path + '.bom.npy'))
+
+    async def test_streaming_exports(self):
+        await sync_to_async(self.save_comparison)()
+
+        response = await self.async_client.get(reverse('export_changes', args=[self.upload.id, 'csv']))
+        self.assertTrue(response.streaming)
+        self.assertTrue(response.is_async)
+        lines = b''.join([chunk async for chunk in response.streaming_content]).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:4], ['component', 'customer_part', 'previous_component', 'change_type'])
+        self.assertEqual(len(lines), 4)
+
+        response = await self.async_client.get(reverse('export_changes', args=[self.upload.id, 'ndjson']))
+        rows = [json.loads(chunk) async for chunk in response.streaming_content]
+        self.assertEqual([row['change_type'] for row in rows], ['changed', 'added', 'removed'])
+
+        # Pages continue after the last id of the previous one
+        paged = [row['component'] async for row in exports.aiter_changes(self.upload, chunk_size=2)]
+        self.assertEqual(paged, [row['component'] for row in rows])
+
+    def test_diff_mode_skips_unchanged_rows(self):
+        wb, rows = self.comparison_rows('diff')
+        self.assertEqual(rows, ['B2', 'N3', 'O4'])
+        summary = list(wb['Summary'].iter_rows(min_row=2, max_row=6, max_col=2, values_only=True))
+        self.assertEqual(summary, [('Changed', 1), ('Description', 0), ('Renamed', 0), ('Added', 1), ('Removed', 1)])
+
+
+class ChangeDetectionTests(TestCase):
+    def entry(self, quantity, description):
+        return {'Quantity': quantity, 'Description': description, 'Mat. Group': ''}
+
+    def test_description_edit_is_flagged(self):
+        data1 = {('A1', 'C1'): self.entry('10', 'Terminal 0.5mm tin')}
+        data2 = {('A1', 'C1'): self.entry('10', 'Terminal 0.5mm gold')}
+        self.assertEqual(list(classify_changes(data1, data2)), [(('A1', 'C1'), ('A1', 'C1'), 'description')])
+
+    def test_renumbered_component_is_paired(self):
+        data1 = {('WIRE-10457B', 'C1'): self.entry('2', 'FLRY-B 0.35 BK')}
+        data2 = {('WIRE-10457A', 'C1'): self.entry('2', 'FLRY-B 0.35 BK'),
+                 ('SEAL-2201', 'C1'): self.entry('1', 'Single wire seal')}
+        self.assertEqual(list(classify_changes(data1, data2)), [
+            (None, ('SEAL-2201', 'C1'), 'removed'),
+            (('WIRE-10457B', 'C1'), ('WIRE-10457A', 'C1'), 'renamed'),
+        ])
+
+    def test_shared_description_does_not_pair_unrelated_components(self):
+        pairs = pair_renames({('W-1000234', 'C1'): 'Cable tie 100mm'}, {('W-1000871', 'C1'): 'Cable tie 100mm'})
+        self.assertEqual(pairs, {})
+
+    def test_renames_stay_within_customer_part(self):
+        pairs = pair_renames({('WIRE-1B', 'C1'): 'FLRY-B 0.35 BK'}, {('WIRE-1A', 'C2'): 'FLRY-B 0.35 BK'})
+        self.assertEqual(pairs, {})
+
+
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.upload = create_upload(name1="file1.xlsx", name2="file2.xlsx")
+
+    def test_index_get_runs_no_queries(self):
+        with self.assertNumQueries(0):
+            self.client.get(reverse('index'))
+
+    def test_uploads_table_served_from_cache(self):
+        with self.assertNumQueries(1):
+            self.client.get(reverse('upload_tables'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('upload_tables'))
+        self.assertEqual([upload.id for upload in response.context['uploaded_files']], [self.upload.id])
+
+    def test_uploads_list_read_before_commit_is_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.upload.save()
+            # A concurrent request caching the list before the transaction commits
+            cache.set(caching.UPLOADS_LIST_KEY, [])
+        self.assertIsNone(cache.get(caching.UPLOADS_LIST_KEY))
+
+    def test_uploads_list_invalidated_on_write(self):
+        self.client.get(reverse('upload_tables'))
+        self.upload.delete()
+        response = self.client.get(reverse('upload_tables'))
+        self.assertEqual(response.context['uploaded_files'], [])
+
+
+class ImportTimeTests(TestCase):
+    def test_worker_start_does_not_load_comparison_stack(self):
+        out = io.StringIO()
+        call_command('import_benchmark', stdout=out)
+        self.assertIn("Cold start", out.getvalue())
+
+
+class LoadTestHarnessTests(TestCase):
+    def test_percentile_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.50), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertIsNone(percentile([], 0.95))
+
+    def test_rejected_upload_counts_as_error(self):
+        self.assertTrue(is_error('upload', 200, b'<div class="error-message">Server busy'))
+        self.assertFalse(is_error('upload', 302, b'/uploads/'))
+        self.assertFalse(is_error('uploads_table', 200, b'<table>'))
+        self.assertTrue(is_error('api', None, b''))
+
+    def test_download_ids_are_resolved_before_timing(self):
+        session = PlannerSession('http://testserver/', [], 1)
+        with mock.patch.object(session, 'api', return_value=(200, b'[]')) as api:
+            self.assertEqual(session.prepare('download', 0), 'uploads_table')
+            self.assertEqual(session.prepare('download', 1), 'uploads_table')
+        self.assertEqual(api.call_count, 1)
+        with mock.patch.object(session, 'api', return_value=(200, b'[{"id": 7, "output": "o.xlsx"}]')):
+            self.assertEqual(session.prepare('download', ID_REFRESH_EVERY), 'download')
+        with mock.patch.object(session, 'request', return_value=(200, b'')) as request:
+            session.download(random.Random(0))
+        request.assert_called_once_with('/download/7/')
+
+    def test_synthetic_boms_compare(self):
+        x, xn = build_synthetic_bom(200, seed=1, change_rate=0.2)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = []
+            for name, content in (('x.xlsx', x), ('xn.xlsx', xn)):
+                paths.append(os.path.join(tmpdir, name))
+                with open(paths[-1], 'wb') as f:
+                    f.write(content)
+            df1, df2 = (read_excel_with_detected_header(path) for path in paths)
+        self.assertEqual(len(df1), 200)
+        self.assertNotEqual(build_data_dict(df1), build_data_dict(df2))
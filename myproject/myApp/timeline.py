@@ -0,0 +1,61 @@
+from django.db import transaction
+from django.db.models import Count
+from .models import ComponentChange, FileUpload
+from .exports import EXPORT_FIELDS
+
+
+PREVIEW_ROWS = 50
+
+
+def record_component_changes(upload, changes, data1, data2, batch_size=1000):
+    """Replace the timeline entries of an upload with the changed rows of its comparison.
+
+    Unchanged components are not stored, so the work and the index size follow
+    the size of the diff rather than the BOM.
+    """
+    entries = []
+    for key1, key2, change in changes:
+        if change == 'unchanged':
+            continue
+        x = data1.get(key1, {})
+        xn = data2.get(key2, {})
+        component, customer_part = key1 or key2
+        entries.append(ComponentChange(
+            upload=upload,
+            week=upload.date1,
+            component=component,
+            customer_part=customer_part,
+            previous_component=key2[0] if change == 'renamed' else '',
+            change_type=change,
+            quantity_x=x.get('Quantity', ''),
+            quantity_xn=xn.get('Quantity', ''),
+            description_x=x.get('Description', ''),
+            description_xn=xn.get('Description', ''),
+        ))
+
+    with transaction.atomic():
+        ComponentChange.objects.filter(upload=upload).delete()
+        ComponentChange.objects.bulk_create(entries, batch_size=batch_size)
+        # No entries may mean no changes, the flag tells that apart from never recorded
+        FileUpload.objects.filter(pk=upload.pk).update(changes_recorded=True)
+    upload.changes_recorded = True
+    return len(entries)
+
+
+def build_comparison_preview(upload, max_rows=PREVIEW_ROWS):
+    """First changed rows of an upload's comparison plus its counts per change type.
+
+    Read from the recorded entries, which carry the same classification the
+    workbook's Summary sheet counts, so neither pandas nor the workbook is loaded.
+    Returns None for an upload whose changes were never recorded.
+    """
+    if not upload.changes_recorded:
+        return None
+    changes = ComponentChange.objects.filter(upload=upload)
+    summary = dict.fromkeys((change for change, _ in ComponentChange.CHANGE_TYPES), 0)
+    summary.update(changes.order_by().values_list('change_type').annotate(Count('id')))
+    summary['total'] = sum(summary.values())
+    return {
+        'rows': list(changes.order_by('id').values(*EXPORT_FIELDS)[:max_rows]),
+        'summary': summary,
+    }
@@ -1,9 +1,21 @@
 import os
 import re
+import hashlib
+import tempfile
+import zipfile
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
 from openpyxl import Workbook
 from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
+from openpyxl.styles.differential import DifferentialStyle
+from openpyxl.formatting.rule import Rule
 from django.conf import settings
+from .matching import clean_value, pair_renames
+from .xlsx import peek_header_row, sheet_stats
+from .concurrency import get_parse_executor, reset_parse_executor
+from .sidecar import StringTable, load_sidecar, write_sidecar
 
 
 # Styling constants
@@ -11,6 +23,8 @@ RED_FILL = PatternFill(start_color='FFFF0000', end_color='FFFF0000', fill_type='
 ORANGE_FILL = PatternFill(start_color='FFFFA500', end_color='FFFFA500', fill_type='solid')
 GRAY_FILL = PatternFill(start_color='DDDDDD', end_color='DDDDDD', fill_type='solid')
 HEADER_FILL = PatternFill(start_color='FFC000', end_color='FFC000', fill_type='solid')
+YELLOW_FILL = PatternFill(start_color='FFFFFF00', end_color='FFFFFF00', fill_type='solid')
+BLUE_FILL = PatternFill(start_color='FF9BC2E6', end_color='FF9BC2E6', fill_type='solid')
 BOLD_FONT = Font(bold=True)
 CENTER_ALIGN = Alignment(horizontal="center")
 THIN_BORDER = Border(left=Side(style='thin'),
@@ -22,44 +36,239 @@ THICK_BORDER = Border(left=Side(style='medium'),
                       top=Side(style='medium'),
                       bottom=Side(style='medium'))
 
-
-def detect_header_row(file_path, expected_headers, max_rows=20):
+# Change types of a component between BOOM(X) and BOOM(X-N)
+CHANGED = 'changed'          # Quantity differs
+DESCRIPTION = 'description'  # Same quantity, description text differs
+RENAMED = 'renamed'          # Component renumbered, paired by similarity
+ADDED = 'added'              # Only in BOOM(X)
+REMOVED = 'removed'          # Only in BOOM(X-N)
+UNCHANGED = 'unchanged'
+CHANGE_TYPES = (CHANGED, DESCRIPTION, RENAMED, ADDED, REMOVED)
+
+OUTPUT_MODES = ('full', 'diff')
+REPORT_STYLES = ('cells', 'conditional')
+STATUS_COLUMN = 'J'  # Hidden change type column driving the conditional formats
+BOM_FIELDS = ('component', 'customer_part', 'quantity', 'description', 'group')
+
+
+EXPECTED_HEADERS = ["Path", "Part number", "Plant", "Customer Part No", "Harness Description",
+                    "Supplier No.", "Component No.", "Wire Number", "Mat. Group",
+                    "Description", "UOM", "Req. Qty"]
+HEADER_SCAN_ROWS = 20
+HEADER_MIN_MATCHES = 5
+HEADER_CACHE_SIZE = 128
+
+# (header_row, preamble fingerprint) -> column labels, most recently used last
+_header_cache = OrderedDict()
+
+
+def score_header_rows(preview, expected_headers, min_matches=HEADER_MIN_MATCHES):
+    """Return the index label of the first row matching enough expected headers."""
+    cells = np.char.lower(preview.astype(str).to_numpy(dtype=str))
+    match_count = np.zeros(len(preview), dtype=int)
+    for expected in expected_headers:
+        match_count += (np.char.find(cells, expected.lower()) >= 0).any(axis=1)
+    matches = np.flatnonzero(match_count >= min_matches)
+    if not len(matches):
+        raise ValueError("Could not find header row containing expected headers.")
+    return preview.index[matches[0]]
+
+
+def detect_header_row(file_path, expected_headers, max_rows=HEADER_SCAN_ROWS):
     preview = pd.read_excel(file_path, header=None, nrows=max_rows)
-    for i, row in preview.iterrows():
-        row_values = row.astype(str).str.lower().tolist()
-        match_count = sum(
-            any(expected.lower() in cell for cell in row_values) for expected in expected_headers
-        )
-        if match_count >= 5:
-            return i
-    raise ValueError("Could not find header row containing expected headers.")
-
-
-def read_excel_with_detected_header(file_path):
-    expected_headers = ["Path", "Part number", "Plant", "Customer Part No", "Harness Description",
-                       "Supplier No.", "Component No.", "Wire Number", "Mat. Group",
-                       "Description", "UOM", "Req. Qty"]
-    header_row = detect_header_row(file_path, expected_headers)
-    df = pd.read_excel(file_path, header=header_row)
-    df = df.dropna(how='all')
+    return score_header_rows(preview, expected_headers)
+
+
+def fingerprint_preamble(preview, header_row):
+    """Hash the cell layout and values of every row up to and including the header."""
+    rows = preview.iloc[:header_row + 1]
+    digest = hashlib.sha1(repr(rows.shape[1]).encode())
+    for row in rows.itertuples(index=False):
+        digest.update(repr(tuple(row)).encode())
+    return digest.hexdigest()
+
+
+def header_labels(values):
+    """Build column labels the way pd.read_excel(header=...) names them."""
+    labels = []
+    seen = {}
+    for i, value in enumerate(values):
+        label = f"Unnamed: {i}" if pd.isna(value) else value
+        if label in seen:
+            seen[label] += 1
+            label = f"{label}.{seen[label]}"
+        else:
+            seen[label] = 0
+        labels.append(label)
+    return labels
+
+
+def lookup_cached_header(preview):
+    for header_row in {row for row, _ in _header_cache}:
+        if header_row >= len(preview):
+            continue
+        key = (header_row, fingerprint_preamble(preview, header_row))
+        if key in _header_cache:
+            _header_cache.move_to_end(key)
+            return header_row, _header_cache[key]
+    return None
+
+
+def cache_header(preview, header_row, columns):
+    _header_cache[(header_row, fingerprint_preamble(preview, header_row))] = columns
+    while len(_header_cache) > HEADER_CACHE_SIZE:
+        _header_cache.popitem(last=False)
+
+
+def peek_header(file):
+    """Header labels of an Excel file, read without loading the whole workbook.
+
+    XLSX files are streamed from the sheet XML up to the detected header row;
+    legacy .xls files fall back to a pandas preview.
+    """
+    try:
+        if zipfile.is_zipfile(file):
+            values = peek_header_row(file, EXPECTED_HEADERS, HEADER_SCAN_ROWS, HEADER_MIN_MATCHES)
+        else:
+            file.seek(0)
+            preview = pd.read_excel(file, header=None, nrows=HEADER_SCAN_ROWS)
+            values = preview.loc[score_header_rows(preview, EXPECTED_HEADERS)].tolist()
+    finally:
+        file.seek(0)
+
+    while values and pd.isna(values[-1]):
+        values.pop()
+    return [str(label) for label in header_labels(values)]
+
+
+def check_sheet_limits(file):
+    """Reject a workbook over COMPARISON_MAX_SHEET_BYTES or COMPARISON_MAX_ROWS before it is parsed.
+
+    ``file`` is an uploaded file or the path of a stored one. XLSX limits are
+    checked against the uncompressed size of the first sheet and its shared
+    strings and the sheet's declared row count; legacy .xls files only have
+    their file size to go by. Sheets that do not declare a row count are held
+    to COMPARISON_MAX_ROWS when they are parsed.
+    """
+    max_bytes = getattr(settings, 'COMPARISON_MAX_SHEET_BYTES', None)
+    max_rows = getattr(settings, 'COMPARISON_MAX_ROWS', None)
+    is_path = isinstance(file, (str, os.PathLike))
+    try:
+        if zipfile.is_zipfile(file):
+            size, rows = sheet_stats(file)
+        else:
+            size, rows = os.path.getsize(file) if is_path else getattr(file, 'size', None), None
+    finally:
+        if not is_path:
+            file.seek(0)
+
+    name = os.path.basename(file) if is_path else getattr(file, 'name', 'Workbook')
+    if max_bytes and size and size > max_bytes:
+        raise ValueError(f"Workbook too large: {name} has {size / 2**20:.0f} MB of sheet data, "
+                         f"the limit is {max_bytes / 2**20:.0f} MB.")
+    if max_rows and rows and rows > max_rows:
+        raise ValueError(f"Workbook too large: {name} has {rows} rows, the limit is {max_rows}.")
+
+
+def read_excel_with_detected_header(file_path, max_rows=None):
+    # Read the sheet once; the header row and labels come from the preamble of the same frame
+    raw = pd.read_excel(file_path, header=None, nrows=max_rows + 1 if max_rows else None)
+    if max_rows and len(raw) > max_rows:
+        # Sheets without a <dimension> get past check_sheet_limits, they stop here
+        raise ValueError(f"Workbook too large: {os.path.basename(file_path)} has more than {max_rows} rows, "
+                         f"the limit is {max_rows}.")
+    preview = raw.head(HEADER_SCAN_ROWS)
+
+    cached = lookup_cached_header(preview)
+    if cached:
+        header_row, columns = cached
+    else:
+        header_row = score_header_rows(preview, EXPECTED_HEADERS)
+        columns = header_labels(raw.iloc[header_row].tolist())
+        cache_header(preview, header_row, columns)
+
+    df = raw.iloc[header_row + 1:].reset_index(drop=True)
+    df.columns = columns
+    df = df.infer_objects().dropna(how='all')
     return df
 
 
-def clean_value(val):
-    return str(val).strip().upper().replace('\xa0', '')
-
-
-def build_data_dict(df, component_col=6, customer_col=3, quantity_col=11, description_col=9):
+def build_data_dict(df, component_col=6, customer_col=3, quantity_col=11, description_col=9, group_col=None):
     return {
         (clean_value(row[component_col]), clean_value(row[customer_col])): {
             'Quantity': str(row[quantity_col]).strip(),
-            'Description': str(row[description_col]).strip()
+            'Description': str(row[description_col]).strip(),
+            'Mat. Group': str(row[group_col]).strip() if group_col is not None else ''
         }
         for _, row in df.iterrows()
         if pd.notna(row[component_col]) and pd.notna(row[customer_col])
     }
 
 
+def data_dict_to_table(data):
+    """Pack a component dict into a variable-length string table"""
+    keys = list(data)
+    return StringTable.from_columns(BOM_FIELDS, [
+        [component for component, _ in keys],
+        [customer_part for _, customer_part in keys],
+        [data[key]['Quantity'] for key in keys],
+        [data[key]['Description'] for key in keys],
+        [data[key]['Mat. Group'] for key in keys],
+    ])
+
+
+def table_to_data_dict(table):
+    return {
+        (component, customer_part): {
+            'Quantity': quantity,
+            'Description': description,
+            'Mat. Group': group
+        }
+        for component, customer_part, quantity, description, group in zip(*map(table.column, BOM_FIELDS))
+    }
+
+
+def parse_bom(file_path, max_rows=None):
+    """Parse one BOM into its header labels and normalized component table.
+
+    Runs in a parse worker process; the table travels back as two flat arrays
+    instead of a pickled DataFrame.
+    """
+    df = read_excel_with_detected_header(file_path, max_rows)
+    return [str(column) for column in df.columns], data_dict_to_table(build_data_dict(df, group_col=8))
+
+
+def parse_boms(*file_paths):
+    """Parse several BOMs at once, in parallel when parse workers are configured"""
+    # Passed along rather than read in the workers, which do not share the web process's settings
+    max_rows = getattr(settings, 'COMPARISON_MAX_ROWS', None)
+    for attempt in range(2):
+        executor = get_parse_executor()
+        if executor is None:
+            return [parse_bom(file_path, max_rows) for file_path in file_paths]
+        try:
+            futures = [executor.submit(parse_bom, file_path, max_rows) for file_path in file_paths]
+            return [future.result() for future in futures]
+        except BrokenProcessPool:
+            # A worker died (usually out of memory) and took the pool with it, retry once on a new one
+            reset_parse_executor(executor)
+    raise ValueError("Parsing the workbooks failed: a parse worker ran out of resources.")
+
+
+def load_boms(*file_paths):
+    """Header labels and component tables of several BOMs.
+
+    Workbooks parsed before are read from their memory-mapped sidecar; the
+    others are parsed (in parallel) and get a sidecar for every later use.
+    """
+    boms = {file_path: load_sidecar(file_path) for file_path in file_paths}
+    missing = [file_path for file_path, bom in boms.items() if bom is None]
+    for file_path, (columns, table) in zip(missing, parse_boms(*missing) if missing else []):
+        write_sidecar(file_path, columns, table)
+        boms[file_path] = load_sidecar(file_path) or (columns, table)
+    return [boms[file_path] for file_path in file_paths]
+
+
 def apply_header_styles(ws):
     for row_num in [1, 2]:
         for col in range(1, 10):
@@ -86,28 +295,35 @@ def set_column_widths(ws):
         ws.column_dimensions[chr(64 + col)].width = width
 
 
-def generate_output(file1_path, file2_path, file):
-    file.refresh_from_db()  # Reload the latest values from the database
-
-    df1 = read_excel_with_detected_header(file1_path)
-    df2 = read_excel_with_detected_header(file2_path)
-
-    if df1.columns.tolist() != df2.columns.tolist():
-        raise ValueError("Headers in BOOM(X) and BOOM(X-N) do not match.")
-
-    data1 = build_data_dict(df1)
-    data2 = build_data_dict(df2)
-
-    all_keys = set(data1.keys()).union(data2.keys())
+def classify_changes(data1, data2):
+    """Yield (X key, X-N key, change type) rows in sorted key order.
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Comparison"
-
-    # Get just the week numbers (KW)
-    kw1 = file.date1.isocalendar()[1]
-    kw2 = file.date2.isocalendar()[1]
+    A key is None on the side where the component is missing. Components only in
+    one of the files are paired up as renames when a similar X-N row exists.
+    """
+    added = {key: data1[key]['Description'] for key in data1.keys() - data2.keys()}
+    removed = {key: data2[key]['Description'] for key in data2.keys() - data1.keys()}
+    renames = pair_renames(added, removed)
+    renamed_from = set(renames.values())
 
+    for key in sorted(set(data1).union(data2)):
+        if key in data1 and key in data2:
+            if data1[key]['Quantity'] != data2[key]['Quantity']:
+                change = CHANGED
+            elif data1[key]['Description'] != data2[key]['Description']:
+                change = DESCRIPTION
+            else:
+                change = UNCHANGED
+            yield key, key, change
+        elif key in renames:
+            yield key, renames[key], RENAMED
+        elif key in data1:
+            yield key, None, ADDED
+        elif key not in renamed_from:
+            yield None, key, REMOVED
+
+
+def write_comparison_header(ws, kw1, kw2):
     # Header Row 1 - Only show KW numbers without dates
     ws.cell(row=1, column=1, value=f"KW {kw1}").fill = HEADER_FILL
     ws.cell(row=1, column=1).font = BOLD_FONT
@@ -129,42 +345,40 @@ def generate_output(file1_path, file2_path, file):
     apply_header_styles(ws)
     set_column_widths(ws)
 
-    # Compare data and fill rows
+
+def write_comparison_rows(ws, changes, data1, data2):
     row_index = 3
-    for key in sorted(all_keys):
-        c, cp = key
-        q1 = data1.get(key, {}).get('Quantity', '')
-        d1 = data1.get(key, {}).get('Description', '')
-        q2 = data2.get(key, {}).get('Quantity', '')
-        d2 = data2.get(key, {}).get('Description', '')
-
-        row = [
-            c if key in data1 else "",
-            cp if key in data1 else "",
-            q1 if key in data1 else "",
-            d1 if key in data1 else "",
-            "",
-            c if key in data2 else "",
-            cp if key in data2 else "",
-            q2 if key in data2 else "",
-            d2 if key in data2 else ""
-        ]
+    for key1, key2, change in changes:
+        c1, cp1 = key1 or ("", "")
+        c2, cp2 = key2 or ("", "")
+        q1 = data1.get(key1, {}).get('Quantity', '')
+        d1 = data1.get(key1, {}).get('Description', '')
+        q2 = data2.get(key2, {}).get('Quantity', '')
+        d2 = data2.get(key2, {}).get('Description', '')
+
+        row = [c1, cp1, q1, d1, "", c2, cp2, q2, d2]
 
         ws.append(row)
         ws.cell(row=row_index, column=5).fill = GRAY_FILL  # Separator
 
-        if key in data1 and key in data2:
+        if key1 and key2:
             if q1 != q2:
                 for col in [1, 2, 3, 6, 7, 8]:  # Component, Customer Part, Quantity for X and X-N
                     ws.cell(row=row_index, column=col).fill = RED_FILL
-
-        elif key in data1 and key not in data2:
-            if c:
+            if d1 != d2:
+                ws.cell(row=row_index, column=4).fill = YELLOW_FILL  # Description (X)
+                ws.cell(row=row_index, column=9).fill = YELLOW_FILL  # Description (X-N)
+            if change == RENAMED:
+                ws.cell(row=row_index, column=1).fill = BLUE_FILL  # Component (X)
+                ws.cell(row=row_index, column=6).fill = BLUE_FILL  # Component (X-N)
+
+        elif change == ADDED:
+            if c1:
                 ws.cell(row=row_index, column=1).fill = ORANGE_FILL  # Component (X)
                 ws.cell(row=row_index, column=4).fill = ORANGE_FILL  # Description (X)
 
-        elif key in data2 and key not in data1:
-            if c:
+        elif change == REMOVED:
+            if c2:
                 ws.cell(row=row_index, column=6).fill = ORANGE_FILL  # Component (X-N)
                 ws.cell(row=row_index, column=9).fill = ORANGE_FILL  # Description (X-N)
 
@@ -175,13 +389,145 @@ def generate_output(file1_path, file2_path, file):
         for cell in row:
             cell.border = THIN_BORDER
 
+
+def write_comparison_rows_conditional(ws, changes, data1, data2):
+    """Write comparison rows styled by a few sheet-level rules instead of per-cell fills.
+
+    Each row carries its change type in a hidden status column; conditional
+    formatting on that column (and on the quantity/description cells) reproduces
+    the red, orange, yellow and blue highlighting, and the separator fill is set
+    once on the column, so no per-cell style is stored.
+    """
+    for key1, key2, change in changes:
+        c1, cp1 = key1 or ("", "")
+        c2, cp2 = key2 or ("", "")
+        ws.append([
+            c1, cp1, data1.get(key1, {}).get('Quantity', ''), data1.get(key1, {}).get('Description', ''),
+            None,  # Separator, styled through the column
+            c2, cp2, data2.get(key2, {}).get('Quantity', ''), data2.get(key2, {}).get('Description', ''),
+            change,
+        ])
+
+    ws.cell(row=2, column=10, value="Status")
+    ws.column_dimensions['E'].fill = GRAY_FILL
+    ws.column_dimensions[STATUS_COLUMN].hidden = True
+
+    last_row = max(ws.max_row, 3)
+    both = '$A3<>"",$F3<>""'
+    # EXACT keeps the comparison case-sensitive like the per-cell styling, <> ignores case
+    rules = [
+        # Earlier rules take priority where fills overlap, renamed components stay blue
+        (f"A3:A{last_row} F3:F{last_row}", f'${STATUS_COLUMN}3="{RENAMED}"', BLUE_FILL),
+        (f"A3:C{last_row} F3:H{last_row}", f'AND({both},NOT(EXACT($C3,$H3)))', RED_FILL),
+        (f"D3:D{last_row} I3:I{last_row}", f'AND({both},NOT(EXACT($D3,$I3)))', YELLOW_FILL),
+        (f"A3:A{last_row} D3:D{last_row}", f'AND(${STATUS_COLUMN}3="{ADDED}",$A3<>"")', ORANGE_FILL),
+        (f"F3:F{last_row} I3:I{last_row}", f'AND(${STATUS_COLUMN}3="{REMOVED}",$F3<>"")', ORANGE_FILL),
+    ]
+    for cell_range, formula, fill in rules:
+        ws.conditional_formatting.add(
+            cell_range, Rule(type='expression', formula=[formula], dxf=DifferentialStyle(fill=fill))
+        )
+    ws.conditional_formatting.add(
+        f"A3:I{last_row}", Rule(type='expression', formula=['TRUE'], dxf=DifferentialStyle(border=THIN_BORDER))
+    )
+
+
+def summarize_changes(changes, data1, data2):
+    """Count change types overall and per Mat. Group, ignoring unchanged rows"""
+    totals = dict.fromkeys(CHANGE_TYPES, 0)
+    by_group = {}
+    for key1, key2, change in changes:
+        if change == UNCHANGED:
+            continue
+        group = (data1.get(key1) or data2[key2])['Mat. Group']
+        totals[change] += 1
+        by_group.setdefault(group, dict.fromkeys(CHANGE_TYPES, 0))[change] += 1
+    return totals, by_group
+
+
+def write_summary_sheet(wb, totals, by_group):
+    ws = wb.create_sheet("Summary")
+    ws.append(["Change", "Count"])
+    for change, count in totals.items():
+        ws.append([change.capitalize(), count])
+
+    ws.append([])
+    group_header_row = ws.max_row + 1
+    ws.append(["Mat. Group"] + [change.capitalize() for change in CHANGE_TYPES])
+    for group in sorted(by_group):
+        ws.append([group] + [by_group[group][change] for change in CHANGE_TYPES])
+
+    for row_num in [1, group_header_row]:
+        for cell in ws[row_num]:
+            cell.font = BOLD_FONT
+            cell.fill = HEADER_FILL
+            cell.border = THIN_BORDER
+    ws.column_dimensions['A'].width = 20
+
+
+def compare_boms(file1_path, file2_path):
+    """Classified changes between BOOM(X) and BOOM(X-N) as (changes, data1, data2)"""
+    (columns1, table1), (columns2, table2) = load_boms(file1_path, file2_path)
+
+    if columns1 != columns2:
+        raise ValueError("Headers in BOOM(X) and BOOM(X-N) do not match.")
+
+    data1 = table_to_data_dict(table1)
+    data2 = table_to_data_dict(table2)
+    return list(classify_changes(data1, data2)), data1, data2
+
+
+def generate_output(file1_path, file2_path, file, mode=None, style=None):
+    """Write the comparison workbook.
+
+    Returns its scratch path, its display filename and the comparison itself as
+    (changes, data1, data2), which callers storing the output record in the
+    component timeline. Nothing is written to the database here.
+
+    In "full" mode every component is listed. In "diff" mode only changed, renamed,
+    added and removed components and description edits are written, followed by a
+    Summary sheet with counts per change type and per Mat. Group.
+
+    The "cells" style fills every highlighted cell, the "conditional" style
+    highlights through sheet-level conditional formatting rules instead.
+    """
+    mode = mode or getattr(settings, 'COMPARISON_OUTPUT_MODE', 'full')
+    if mode not in OUTPUT_MODES:
+        raise ValueError(f"Unknown comparison output mode: {mode}")
+    style = style or getattr(settings, 'COMPARISON_REPORT_STYLE', 'cells')
+    if style not in REPORT_STYLES:
+        raise ValueError(f"Unknown comparison report style: {style}")
+    write_rows = write_comparison_rows_conditional if style == 'conditional' else write_comparison_rows
+
+    file.refresh_from_db()  # Reload the latest values from the database
+
+    changes, data1, data2 = compare_boms(file1_path, file2_path)
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Comparison"
+
+    # Get just the week numbers (KW)
+    kw1 = file.date1.isocalendar()[1]
+    kw2 = file.date2.isocalendar()[1]
+
+    write_comparison_header(ws, kw1, kw2)
+
+    if mode == 'diff':
+        write_rows(ws, (row for row in changes if row[2] != UNCHANGED), data1, data2)
+        write_summary_sheet(wb, *summarize_changes(changes, data1, data2))
+    else:
+        write_rows(ws, changes, data1, data2)
+
     # Save
     output_filename = f"Comparison_Sitz_Rechts_VE_from_KW{kw1}_to_KW{kw2}.xlsx"
     output_filename = re.sub(r'[^\w\s\-_\[\]]', '', output_filename).strip()
 
     output_dir = os.path.join(settings.MEDIA_ROOT, 'outputs')
     os.makedirs(output_dir, exist_ok=True)
-    output_path = os.path.join(output_dir, output_filename)
+    # Unique scratch file, concurrent comparisons of the same weeks must not overwrite each other
+    fd, output_path = tempfile.mkstemp(dir=output_dir, suffix='.xlsx')
+    os.close(fd)
 
     wb.save(output_path)
-    return output_path, output_filename
+    return output_path, output_filename, (changes, data1, data2)
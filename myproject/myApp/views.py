@@ -1,22 +1,25 @@
+import io
 import os
 import re
-import pandas as pd
 from django.core.files import File
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.conf import settings
+from django.db import transaction
 from .models import FileUpload
 from .forms import ExcelFileUploadForm
-from .utils import generate_output
+from .storage import release_files
+from .concurrency import run_blocking, comparison_slot
+from .caching import aget_uploads_list, get_comparison_preview
+from .exports import EXPORT_FORMATS, STREAMS, aiter_changes
+from .timeline import record_component_changes
 from datetime import date
 from django.utils import timezone
-from django.http import HttpResponse
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse, Http404
+from django.urls import reverse
+from asgiref.sync import sync_to_async
 from django.utils.encoding import smart_str
 from django.contrib import messages
 from django.views.decorators.cache import never_cache 
-from rest_framework.views import APIView
-from rest_framework.response import Response
-from rest_framework import status
-from .serializers import FileUploadSerializer
 
 
 def parse_week_string(week_str):
@@ -43,12 +46,11 @@ def extract_week_from_filename(filename):
 
 def validate_excel_headers(file1, file2):
     """Validate that both Excel files have identical headers"""
-    try:
-        df1 = pd.read_excel(file1, nrows=0)
-        df2 = pd.read_excel(file2, nrows=0)
+    from .utils import peek_header
 
-        if list(df1.columns) != list(df2.columns):
-            mismatched = set(df1.columns).symmetric_difference(set(df2.columns))
+    try:
+        # Only the top of each sheet is parsed, so a mismatch fails before anything is saved
+        if peek_header(file1) != peek_header(file2):
             raise ValueError(f"Header mismatch detected.")
 
         return True
@@ -70,7 +72,6 @@ def handle_date_parsing(date_str, file_week, current_year):
 def handle_error_rendering(request, form, error, error_type, date1_initial, date2_initial):
     return render(request, "index.html", {
         'form': form,
-        'uploaded_files': FileUpload.objects.all().order_by('-id'),
         'error': error,
         'error_type': error_type,
         'date1_initial': date1_initial,
@@ -78,32 +79,49 @@ def handle_error_rendering(request, form, error, error_type, date1_initial, date
     })
 
 
-@never_cache
-def index(request):
-    if request.method == 'POST':
-        form = ExcelFileUploadForm(request.POST, request.FILES)
-        if form.is_valid():
-            
-            try:
-                current_year = timezone.now().year
-                file1 = request.FILES.get('file1')
-                file2 = request.FILES.get('file2')
-                file1_week = extract_week_from_filename(file1.name) if file1 else None
-                file2_week = extract_week_from_filename(file2.name) if file2 else None
-
-                date1_str = request.POST.get('date1')
-                date2_str = request.POST.get('date2')
-
-                # Parse dates
-                date1 = handle_date_parsing(date1_str, file1_week, current_year)
-                date2 = handle_date_parsing(date2_str, file2_week, current_year)
-
-                # Validate dates
-                if not date1 or not date2:
-                    raise ValueError("Missing date input and unable to extract week number from filenames.")
-                if date1 <= date2:
-                    raise ValueError("KW(X) must be later than KW(X-N)")
+def save_comparison(upload, output_path, output_filename, comparison):
+    """Store a generated comparison workbook and its timeline entries, then drop the scratch file"""
+    try:
+        # One transaction: the timeline never describes an output that failed to save, and
+        # the storage holds the output blob's lock until the row points at it
+        with open(output_path, 'rb') as f, transaction.atomic():
+            upload.output.save(output_filename, File(f), save=True)
+            record_component_changes(upload, *comparison)
+    finally:
+        os.remove(output_path)
+
+
+def compare_uploads(request):
+    # The comparison stack (pandas, openpyxl) loads on the first comparison, not at worker start
+    from .utils import generate_output, check_sheet_limits
+
+    form = ExcelFileUploadForm(request.POST, request.FILES)
+    if form.is_valid():
+        try:
+            current_year = timezone.now().year
+            file1 = request.FILES.get('file1')
+            file2 = request.FILES.get('file2')
+            file1_week = extract_week_from_filename(file1.name) if file1 else None
+            file2_week = extract_week_from_filename(file2.name) if file2 else None
+
+            date1_str = request.POST.get('date1')
+            date2_str = request.POST.get('date2')
+
+            # Parse dates
+            date1 = handle_date_parsing(date1_str, file1_week, current_year)
+            date2 = handle_date_parsing(date2_str, file2_week, current_year)
+
+            # Validate dates
+            if not date1 or not date2:
+                raise ValueError("Missing date input and unable to extract week number from filenames.")
+            if date1 <= date2:
+                raise ValueError("KW(X) must be later than KW(X-N)")
 
+            # Oversized workbooks are turned away before anything is parsed or queued
+            check_sheet_limits(file1)
+            check_sheet_limits(file2)
+
+            with comparison_slot():
                 # Validate headers
                 validate_excel_headers(file1, file2)
 
@@ -114,78 +132,112 @@ def index(request):
                 instance.save()
 
                 # Generate output
-                output_path, output_filename = generate_output(
+                output_path, output_filename, comparison = generate_output(
                     instance.file1.path,
                     instance.file2.path,
                     instance
                 )
+                save_comparison(instance, output_path, output_filename, comparison)
 
-                with open(output_path, 'rb') as f:
-                    instance.output.save(output_filename, File(f), save=True)
-
-                # Store results in session
-                request.session['extracted_data'] = pd.read_excel(output_path).to_dict(orient='records')
-                messages.success(request, "Files compared successfully!")
-                return redirect('upload_tables')
+            # The preview itself is shared through the cache, the session only remembers which one
+            request.session['last_upload_id'] = instance.id
+            messages.success(request, "Files compared successfully!")
+            return redirect('upload_tables')
 
-            except ValueError as e:
-                error_type = "validation_error"
-                if "Header mismatch" in str(e):
-                    error_type = "header_error"
-                elif "KW(X) must be later" in str(e):
-                    error_type = "date_error"
+        except ValueError as e:
+            error_type = "validation_error"
+            if "Header mismatch" in str(e):
+                error_type = "header_error"
+            elif "KW(X) must be later" in str(e):
+                error_type = "date_error"
 
-                initial_date1 = f"{current_year}-W{file1_week:02d}" if not date1_str and file1_week else date1_str or ''
-                initial_date2 = f"{current_year}-W{file2_week:02d}" if not date2_str and file2_week else date2_str or ''
+            initial_date1 = f"{current_year}-W{file1_week:02d}" if not date1_str and file1_week else date1_str or ''
+            initial_date2 = f"{current_year}-W{file2_week:02d}" if not date2_str and file2_week else date2_str or ''
 
-                return handle_error_rendering(request, form, str(e), error_type, initial_date1, initial_date2)
-            except Exception as e:
-                initial_date1 = f"{current_year}-W{file1_week:02d}" if not date1_str and file1_week else date1_str or ''
-                initial_date2 = f"{current_year}-W{file2_week:02d}" if not date2_str and file2_week else date2_str or ''
+            return handle_error_rendering(request, form, str(e), error_type, initial_date1, initial_date2)
+        except Exception as e:
+            initial_date1 = f"{current_year}-W{file1_week:02d}" if not date1_str and file1_week else date1_str or ''
+            initial_date2 = f"{current_year}-W{file2_week:02d}" if not date2_str and file2_week else date2_str or ''
 
-                return handle_error_rendering(request, form, f"An unexpected error occurred: {str(e)}", "system_error", initial_date1, initial_date2)
-    else:
-        form = ExcelFileUploadForm()
+            return handle_error_rendering(request, form, f"An unexpected error occurred: {str(e)}", "system_error", initial_date1, initial_date2)
 
     return render(request, "index.html", {
         'form': form,
-        'uploaded_files': FileUpload.objects.all().order_by('-id'),
         'date1_initial': '',
         'date2_initial': ''
     })
 
 
 @never_cache
-def uploads_table(request):
-    uploaded_files = FileUpload.objects.all().order_by('-id')
-    return render(request, 'upload_tables.html', {
-        'uploaded_files': uploaded_files,
-        'extracted_data': request.session.get('extracted_data', [])
+async def index(request):
+    if request.method == 'POST':
+        # Saving and comparing the workbooks blocks, so it runs on the comparison executor
+        return await run_blocking(compare_uploads, request)
+
+    return await sync_to_async(render)(request, "index.html", {
+        'form': ExcelFileUploadForm(),
+        'date1_initial': '',
+        'date2_initial': ''
+    })
+
+
+@never_cache
+async def uploads_table(request):
+    preview = None
+    last_upload_id = await request.session.aget('last_upload_id')
+    if last_upload_id:
+        last_upload = await FileUpload.objects.filter(id=last_upload_id).afirst()
+        if last_upload:
+            preview = await sync_to_async(get_comparison_preview)(last_upload)
+
+    return await sync_to_async(render)(request, 'upload_tables.html', {
+        'uploaded_files': await aget_uploads_list(),
+        'output_mode': getattr(settings, 'COMPARISON_OUTPUT_MODE', 'full'),
+        'extracted_data': preview['rows'] if preview else [],
+        'comparison_summary': preview['summary'] if preview else None,
+    })
+
+
+async def comparison_preview(request, upload_id):
+    file_record = await aget_object_or_404(FileUpload, id=upload_id)
+    preview = await sync_to_async(get_comparison_preview)(file_record)
+    if preview is None:
+        error = "No recorded changes for this upload." if file_record.output else "No output file available."
+        return JsonResponse({'error': error}, status=404)
+    return JsonResponse(preview)
+
+
+async def upload_status(request, upload_id):
+    file_record = await aget_object_or_404(FileUpload, id=upload_id)
+    return JsonResponse({
+        'id': file_record.id,
+        'ready': bool(file_record.output),
+        'download_url': reverse('download_output', args=[file_record.id]) if file_record.output else None,
     })
 
 
 def delete_upload(request, upload_id):
     upload = get_object_or_404(FileUpload, id=upload_id)
-
-    # Delete associated files
-    for file_field in [upload.file1, upload.file2, upload.output]:
-        if file_field:
-            path = os.path.join(settings.MEDIA_ROOT, str(file_field))
-            if os.path.exists(path):
-                os.remove(path)
+    stored_names = [upload.file1.name, upload.file2.name, upload.output.name]
 
     upload.delete()
+
+    # Delete associated files no other upload shares
+    release_files(*stored_names)
     messages.success(request, "Upload deleted successfully!")
     return redirect('upload_tables')
 
 
 def update_upload(request, upload_id):
+    from .utils import generate_output, check_sheet_limits
+
     file_record = get_object_or_404(FileUpload, id=upload_id)
     current_year = timezone.now().year
 
     if request.method == 'POST':
         try:
             changed = False
+            previous_names = [file_record.file1.name, file_record.file2.name, file_record.output.name]
 
             # Handle file updates
             if 'file1' in request.FILES:
@@ -218,23 +270,30 @@ def update_upload(request, upload_id):
             if file_record.date1 and file_record.date2 and file_record.date1 <= file_record.date2:
                 raise ValueError("KW(X) must be later than KW(X-N)")
 
-            # Validate headers if files were changed
-            if changed and ('file1' in request.FILES or 'file2' in request.FILES):
-                file1 = request.FILES['file1'] if 'file1' in request.FILES else file_record.file1
-                file2 = request.FILES['file2'] if 'file2' in request.FILES else file_record.file2
-                validate_excel_headers(file1, file2)
-
             if changed:
-                file_record.save()
-
-                # Regenerate output
-                output_path, output_filename = generate_output(
-                    file_record.file1.path,
-                    file_record.file2.path,
-                    file_record
-                )
-                with open(output_path, 'rb') as f:
-                    file_record.output.save(output_filename, File(f), save=True)
+                # Stored files were checked when they were uploaded, only new ones need it
+                for uploaded in request.FILES.values():
+                    check_sheet_limits(uploaded)
+
+                with comparison_slot():
+                    # Validate headers if files were changed
+                    if 'file1' in request.FILES or 'file2' in request.FILES:
+                        file1 = request.FILES['file1'] if 'file1' in request.FILES else file_record.file1
+                        file2 = request.FILES['file2'] if 'file2' in request.FILES else file_record.file2
+                        validate_excel_headers(file1, file2)
+
+                    file_record.save()
+
+                    # Regenerate output
+                    output_path, output_filename, comparison = generate_output(
+                        file_record.file1.path,
+                        file_record.file2.path,
+                        file_record
+                    )
+                    save_comparison(file_record, output_path, output_filename, comparison)
+
+                    # Drop the replaced files unless another upload still uses them
+                    release_files(*previous_names)
 
                 messages.success(request, "Upload updated successfully!")
             else:
@@ -289,15 +348,48 @@ def update_upload(request, upload_id):
     })
 
 
-def download_output(request, upload_id):
-    file_record = get_object_or_404(FileUpload, id=upload_id)
+def build_full_report(file_record):
+    from .utils import generate_output, check_sheet_limits
+
+    # A full parse and report like any comparison, so under the same limits and cap
+    check_sheet_limits(file_record.file1.path)
+    check_sheet_limits(file_record.file2.path)
+    with comparison_slot():
+        output_path, _, _ = generate_output(file_record.file1.path, file_record.file2.path, file_record, mode='full')
+    try:
+        with open(output_path, 'rb') as f:
+            return f.read()
+    finally:
+        os.remove(output_path)
+
+
+async def download_input(request, upload_id, side):
+    file_record = await aget_object_or_404(FileUpload, id=upload_id)
+    fields = {'x': 'file1', 'xn': 'file2'}
+    if side not in fields:
+        raise Http404("Side must be 'x' or 'xn'.")
+
+    # Served under the name it was uploaded with, the stored name is the content hash
+    field = fields[side]
+    try:
+        stored = getattr(file_record, field).open('rb')
+    except (FileNotFoundError, ValueError):
+        # ValueError when the field is empty, FileNotFoundError when the blob is gone
+        raise Http404("The uploaded file is no longer available.")
+    return FileResponse(
+        stored,
+        as_attachment=True,
+        filename=smart_str(file_record.original_name(field)),
+    )
+
+
+async def download_output(request, upload_id):
+    file_record = await aget_object_or_404(FileUpload, id=upload_id)
 
     if not file_record.output:
         messages.error(request, "No output file available for download.")
         return redirect('upload_tables')
 
-    output_path = file_record.output.path
-
     if file_record.date1 and file_record.date2:
         kw1 = file_record.date1.isocalendar()[1]
         kw2 = file_record.date2.isocalendar()[1]
@@ -306,27 +398,44 @@ def download_output(request, upload_id):
         custom_filename = "Comparison_Output.xlsx"
 
     try:
-        with open(output_path, 'rb') as f:
-            response = HttpResponse(
-                f.read(),
+        if request.GET.get('variant') == 'full':
+            # The stored output may only hold the differences, build the complete report on demand
+            custom_filename = custom_filename.replace('.xlsx', '_full.xlsx')
+            return FileResponse(
+                io.BytesIO(await run_blocking(build_full_report, file_record)),
+                as_attachment=True,
+                filename=smart_str(custom_filename),
                 content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
             )
-            response['Content-Disposition'] = f'attachment; filename="{smart_str(custom_filename)}"'
-            return response
+
+        # Streamed in chunks instead of reading the whole workbook into memory
+        return FileResponse(
+            open(file_record.output.path, 'rb'),
+            as_attachment=True,
+            filename=smart_str(custom_filename),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+    except FileNotFoundError:
+        messages.error(request, "The output file is no longer available, update the upload to regenerate it.")
+        return redirect('upload_tables')
     except Exception as e:
         messages.error(request, f"Error preparing file for download: {str(e)}")
         return redirect('upload_tables')
 
 
-class FileUploadListAPIView(APIView):
-    def get(self, request):
-        uploads = FileUpload.objects.all().order_by('-id')
-        serializer = FileUploadSerializer(uploads, many=True)
-        return Response(serializer.data)
-
-    def post(self, request):
-        serializer = FileUploadSerializer(data=request.data)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+async def export_changes(request, upload_id, export_format):
+    file_record = await aget_object_or_404(FileUpload, id=upload_id)
+    if export_format not in EXPORT_FORMATS:
+        raise Http404("Export format must be 'csv' or 'ndjson'.")
+    if not file_record.output:
+        return JsonResponse({'error': "No comparison available for this upload."}, status=404)
+    if not file_record.changes_recorded:
+        return JsonResponse({'error': "No recorded changes for this upload."}, status=404)
+
+    # Async generators, so ASGI sends each chunk as it is read instead of collecting them first
+    response = StreamingHttpResponse(
+        STREAMS[export_format](aiter_changes(file_record)),
+        content_type=EXPORT_FORMATS[export_format],
+    )
+    response['Content-Disposition'] = f'attachment; filename="comparison_{file_record.id}.{export_format}"'
+    return response
@@ -0,0 +1,141 @@
+import posixpath
+import zipfile
+from xml.etree.ElementTree import iterparse, parse
+
+
+MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+PACKAGE_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+DEFAULT_SHEET = 'xl/worksheets/sheet1.xml'
+
+
+def column_index(reference):
+    """Zero-based column of a cell reference such as 'AB12'"""
+    index = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - 64
+    return index - 1
+
+
+def first_sheet_path(archive):
+    """Path of the first worksheet in workbook order, the one pd.read_excel reads by default"""
+    try:
+        with archive.open('xl/workbook.xml') as workbook:
+            sheet = parse(workbook).getroot().find(f'{MAIN_NS}sheets/{MAIN_NS}sheet')
+        with archive.open('xl/_rels/workbook.xml.rels') as rels:
+            targets = {rel.get('Id'): rel.get('Target') for rel in parse(rels).getroot().iter(f'{PACKAGE_REL_NS}Relationship')}
+        target = targets[sheet.get(f'{REL_NS}id')]
+    except (KeyError, AttributeError):
+        return DEFAULT_SHEET
+    if target.startswith('/'):
+        return target.lstrip('/')
+    return posixpath.normpath(posixpath.join('xl', target))
+
+
+class SharedStrings:
+    """Shared-string table parsed on demand, only as far as the highest index requested"""
+
+    def __init__(self, archive):
+        self.strings = []
+        self.stream = None
+        if 'xl/sharedStrings.xml' in archive.namelist():
+            self.stream = archive.open('xl/sharedStrings.xml')
+            self.elements = iterparse(self.stream)
+
+    def __getitem__(self, index):
+        while index >= len(self.strings) and self.stream is not None:
+            try:
+                _, element = next(self.elements)
+            except StopIteration:
+                self.close()
+                break
+            if element.tag == f'{MAIN_NS}si':
+                self.strings.append(''.join(text.text or '' for text in element.iter(f'{MAIN_NS}t')))
+                element.clear()
+        return self.strings[index] if index < len(self.strings) else None
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+
+def iter_sheet_rows(archive, sheet_path):
+    """Yield (zero-based row index, {column index: (cell type, raw value)}) for each stored row"""
+    with archive.open(sheet_path) as sheet:
+        for position, (_, element) in enumerate(
+                item for item in iterparse(sheet) if item[1].tag == f'{MAIN_NS}row'):
+            row = int(element.get('r', position + 1)) - 1
+            cells = {}
+            for cell_position, cell in enumerate(element.iter(f'{MAIN_NS}c')):
+                reference = cell.get('r')
+                column = column_index(reference) if reference else cell_position
+                cell_type = cell.get('t', 'n')
+                if cell_type == 'inlineStr':
+                    value = ''.join(text.text or '' for text in cell.iter(f'{MAIN_NS}t'))
+                else:
+                    value = cell.findtext(f'{MAIN_NS}v')
+                if value is not None:
+                    cells[column] = (cell_type, value)
+            element.clear()
+            yield row, cells
+
+
+def dimension_rows(reference):
+    """Last row number of a range reference such as 'A1:J5000', None when it has none"""
+    digits = ''.join(char for char in reference.split(':')[-1] if char.isdigit())
+    return int(digits) if digits else None
+
+
+def sheet_stats(file):
+    """(uncompressed bytes, row count) of the first worksheet, read from metadata only.
+
+    The size comes from the zip directory and includes the shared strings, which
+    hold the sheet's text; the row count comes from the sheet's <dimension>
+    element, which precedes the cell data, and is None when the writer left the
+    dimension out.
+    """
+    with zipfile.ZipFile(file) as archive:
+        sheet_path = first_sheet_path(archive)
+        size = archive.getinfo(sheet_path).file_size
+        if 'xl/sharedStrings.xml' in archive.namelist():
+            size += archive.getinfo('xl/sharedStrings.xml').file_size
+        rows = None
+        with archive.open(sheet_path) as sheet:
+            for _, element in iterparse(sheet, events=('start',)):
+                if element.tag == f'{MAIN_NS}dimension':
+                    rows = dimension_rows(element.get('ref', ''))
+                    break
+                if element.tag == f'{MAIN_NS}sheetData':
+                    break
+    return size, rows
+
+
+def count_header_matches(values, expected_headers):
+    cells = [str(value).lower() for value in values if value is not None]
+    return sum(any(expected.lower() in cell for cell in cells) for expected in expected_headers)
+
+
+def peek_header_row(file, expected_headers, max_rows, min_matches):
+    """Return the header row of an XLSX file by streaming only the top of its first sheet.
+
+    Rows are parsed one by one from the sheet XML inside the zip and parsing stops
+    at the first row matching enough expected headers; shared strings are only
+    resolved up to the highest index those rows use.
+    """
+    with zipfile.ZipFile(file) as archive:
+        shared_strings = SharedStrings(archive)
+        try:
+            for row, cells in iter_sheet_rows(archive, first_sheet_path(archive)):
+                if row >= max_rows:
+                    break
+                values = [None] * (max(cells, default=-1) + 1)
+                for column, (cell_type, value) in cells.items():
+                    values[column] = shared_strings[int(value)] if cell_type == 's' else value
+                if count_header_matches(values, expected_headers) >= min_matches:
+                    return values
+        finally:
+            shared_strings.close()
+    raise ValueError("Could not find header row containing expected headers.")
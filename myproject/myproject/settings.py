@@ -11,7 +11,6 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
-import mysql.connector.django
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -97,6 +96,24 @@ DATABASES = {
         'PASSWORD': '123456',
         'HOST': 'localhost',
         'PORT': '3306',
+        # Closed after each request: under ASGI every request's sync ORM work runs in its own
+        # thread, so persistent connections are never reused and pile up towards MySQL's
+        # max_connections
+        'CONN_MAX_AGE': 0,
+    }
+}
+
+# Cache shared by all worker processes on this host (uploads list, comparison previews)
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
     }
 }
 
@@ -143,4 +160,34 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 import os
 
 MEDIA_URL = '/uploads/'  # This is the URL prefix
-MEDIA_ROOT = os.path.join(BASE_DIR, 'uploads')  # This is the actual folder path
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'uploads')  # This is the actual folder path
+# "full" writes every component to the comparison output, "diff" only changed, added
+# and removed ones plus a summary sheet (the full report is then built on download)
+COMPARISON_OUTPUT_MODE = 'full'
+
+# "cells" fills each highlighted cell, "conditional" uses a hidden status column and a
+# few conditional formatting rules, which keeps large reports small and fast to open
+COMPARISON_REPORT_STYLE = 'cells'
+
+# Threads running blocking comparison work for the async views, see myApp/concurrency.py
+COMPARISON_WORKERS = 4
+
+# Processes parsing BOOM(X) and BOOM(X-N) side by side, below 2 parses inline
+COMPARISON_PARSE_WORKERS = 2
+
+# Workbooks are rejected before parsing when their first sheet exceeds these (None disables)
+COMPARISON_MAX_SHEET_BYTES = 100 * 1024 * 1024
+COMPARISON_MAX_ROWS = 200000
+
+# Comparisons running at once per process, and how long a request waits for a free slot
+# before it is turned away as busy
+COMPARISON_MAX_CONCURRENT = 2
+COMPARISON_QUEUE_TIMEOUT = 30
+
+# Retention of stored uploads, see myApp/retention.py and the purge_uploads command
+UPLOAD_RETENTION = {
+    'MAX_AGE_DAYS': None,
+    'MAX_COUNT': None,
+    'ORPHAN_GRACE_HOURS': 24,
+    'BATCH_SIZE': 200,
+}
@@ -0,0 +1,28 @@
+"""
+Settings for load-testing a local server without the production MySQL database.
+
+    python manage.py migrate --settings=myproject.settings_loadtest
+    DJANGO_SETTINGS_MODULE=myproject.settings_loadtest uvicorn myproject.asgi:application --workers 4
+    python manage.py loadtest --url http://127.0.0.1:8000 --server-pid <pid>
+"""
+
+from .settings import *  # noqa: F401,F403
+
+DEBUG = False
+
+ALLOWED_HOSTS = ['127.0.0.1', 'localhost']
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'loadtest.sqlite3',
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {
+            'timeout': 30,
+        },
+    }
+}
+
+MEDIA_ROOT = os.path.join(BASE_DIR, 'loadtest_uploads')
+
+CACHES['default']['LOCATION'] = BASE_DIR / 'loadtest_cache'
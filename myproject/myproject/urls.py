@@ -3,7 +3,7 @@ from django.urls import path
 from myApp import views  
 from django.conf import settings
 from django.conf.urls.static import static
-from myApp.views import FileUploadListAPIView
+from myApp.lazy import LazyAPIView
 
 
 urlpatterns = [
@@ -13,7 +13,13 @@ urlpatterns = [
     path('delete/<int:upload_id>/', views.delete_upload, name='delete_upload'),  
     path('update/<int:upload_id>/', views.update_upload, name='update_upload'),
     path('download/<int:upload_id>/', views.download_output, name='download_output'),
-    path('api/uploads/', FileUploadListAPIView.as_view(), name='api-uploads'),
+    path('download/<int:upload_id>/<str:side>/', views.download_input, name='download_input'),
+    path('status/<int:upload_id>/', views.upload_status, name='upload_status'),
+    path('preview/<int:upload_id>/', views.comparison_preview, name='comparison_preview'),
+    path('export/<int:upload_id>/<str:export_format>/', views.export_changes, name='export_changes'),
+    path('api/uploads/', LazyAPIView('myApp.api.FileUploadListAPIView'), name='api-uploads'),
+    path('api/uploads/<int:upload_id>/bom/<str:side>/', LazyAPIView('myApp.api.BomRowsAPIView'), name='api-upload-bom'),
+    path('api/components/<str:component>/timeline/', LazyAPIView('myApp.api.ComponentTimelineAPIView'), name='api-component-timeline'),
    
 
 ]